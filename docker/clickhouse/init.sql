@@ -5,8 +5,9 @@ CREATE TABLE IF NOT EXISTS event_log
     `environment` String,
     `event_context` String,
     `metadata_version` Int32 DEFAULT 1,
+    `event_id` UUID,
 )
-ENGINE = MergeTree()
+ENGINE = ReplacingMergeTree()
 PARTITION BY toYYYYMM(event_date_time)
-ORDER BY (event_date_time, event_type)
-SETTINGS index_granularity = 8192
+ORDER BY (event_date_time, event_type, event_id)
+SETTINGS index_granularity = 8192, non_replicated_deduplication_window = 1000
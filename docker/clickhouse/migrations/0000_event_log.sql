@@ -0,0 +1,17 @@
+-- The event_log table as docker/clickhouse/init.sql creates it, for servers set up
+-- without the init script or with a custom CLICKHOUSE_EVENT_LOG_TABLE_NAME.
+-- Later changes go in migrations of their own, never here.
+
+CREATE TABLE IF NOT EXISTS $event_log
+(
+    `event_type` String,
+    `event_date_time` DateTime64(6),
+    `environment` String,
+    `event_context` String,
+    `metadata_version` Int32 DEFAULT 1,
+    `event_id` UUID
+)
+ENGINE = ReplacingMergeTree()
+PARTITION BY toYYYYMM(event_date_time)
+ORDER BY (event_date_time, event_type, event_id)
+SETTINGS index_granularity = 8192, non_replicated_deduplication_window = 1000;
@@ -0,0 +1,7 @@
+-- event_type and environment hold a handful of distinct values: dictionary encode them.
+-- Typed context_<field> columns for projected event fields are added by migrate_clickhouse
+-- from the event registry, see core.events.register_event.
+
+ALTER TABLE $event_log MODIFY COLUMN `event_type` LowCardinality(String);
+
+ALTER TABLE $event_log MODIFY COLUMN `environment` LowCardinality(String);
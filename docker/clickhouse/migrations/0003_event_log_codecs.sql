@@ -0,0 +1,10 @@
+-- Column codecs: only new parts are written with them, existing parts are recompressed
+-- as merges rewrite them, so the ALTERs only change metadata.
+-- Timestamps arrive close to sorted: store the deltas between them.
+-- event_context is JSON text that ZSTD compresses far better than the default LZ4.
+
+ALTER TABLE $event_log MODIFY COLUMN `event_date_time` DateTime64(6) CODEC(Delta, ZSTD(1));
+
+ALTER TABLE $event_log MODIFY COLUMN `event_context` String CODEC(ZSTD(3));
+
+ALTER TABLE $event_log MODIFY COLUMN `metadata_version` Int32 DEFAULT 1 CODEC(T64, ZSTD(1));
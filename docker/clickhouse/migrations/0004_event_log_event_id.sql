@@ -0,0 +1,25 @@
+-- event_log tables created by the original init.sql have no event_id and no deduplication
+-- window, and inserts now send event ids and deduplication tokens. Add both in place.
+-- Rows from before the column get the zero UUID.
+
+ALTER TABLE $event_log ADD COLUMN IF NOT EXISTS `event_id` UUID;
+
+ALTER TABLE $event_log MODIFY SETTING non_replicated_deduplication_window = 1000;
+
+-- Such a table also stays a plain MergeTree, so redelivered events are never collapsed.
+-- An engine or sorting key can't be altered: the table has to be rebuilt, copying every row.
+-- With the outbox drain paused:
+--
+--   CREATE TABLE event_log_rebuild AS $event_log
+--   ENGINE = ReplacingMergeTree PARTITION BY toYYYYMM(event_date_time)
+--   ORDER BY (event_date_time, event_type, event_id)
+--   SETTINGS non_replicated_deduplication_window = 1000;
+--   -- old rows share the zero UUID and would collapse into one: give them ids of their own
+--   INSERT INTO event_log_rebuild SELECT * REPLACE (
+--       if(event_id = toUUID('00000000-0000-0000-0000-000000000000'), generateUUIDv4(), event_id) AS event_id
+--   ) FROM $event_log;
+--   EXCHANGE TABLES $event_log AND event_log_rebuild;
+--   DROP TABLE event_log_rebuild;
+--
+-- then drop the event_counts_*_mv views and create them again from
+-- 0001_event_counts_rollups.sql, so they read from the rebuilt table.
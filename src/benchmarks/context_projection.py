@@ -0,0 +1,149 @@
+"""
+Compare filtering on an event_context field stored as JSON with the typed,
+bloom-indexed context_<field> column added by projections.
+
+Loads the same rows into two scratch tables, one with the original event_log
+schema and one with LowCardinality event_type/environment plus a projected
+context_email column, then reports their on-disk size and the latency of
+looking up a single email.
+
+    python -m benchmarks.context_projection --rows 1000000
+"""
+import argparse
+import datetime as dt
+import os
+import statistics
+import time
+import uuid
+
+import django
+from clickhouse_connect.driver import Client
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+
+JSON_TABLE = 'event_log_bench_json'
+PROJECTED_TABLE = 'event_log_bench_projected'
+COLUMNS = ['event_type', 'event_date_time', 'environment', 'event_context', 'metadata_version', 'event_id']
+
+TABLES = {
+    JSON_TABLE: f"""
+        CREATE TABLE {JSON_TABLE}
+        (
+            `event_type` String,
+            `event_date_time` DateTime64(6),
+            `environment` String,
+            `event_context` String,
+            `metadata_version` Int32 DEFAULT 1,
+            `event_id` UUID
+        )
+        ENGINE = ReplacingMergeTree()
+        PARTITION BY toYYYYMM(event_date_time)
+        ORDER BY (event_date_time, event_type, event_id)
+    """,
+    PROJECTED_TABLE: f"""
+        CREATE TABLE {PROJECTED_TABLE}
+        (
+            `event_type` LowCardinality(String),
+            `event_date_time` DateTime64(6),
+            `environment` LowCardinality(String),
+            `event_context` String,
+            `metadata_version` Int32 DEFAULT 1,
+            `event_id` UUID,
+            `context_email` String DEFAULT JSONExtractString(event_context, 'email'),
+            INDEX `context_email_bloom` `context_email` TYPE bloom_filter(0.01) GRANULARITY 4
+        )
+        ENGINE = ReplacingMergeTree()
+        PARTITION BY toYYYYMM(event_date_time)
+        ORDER BY (event_date_time, event_type, event_id)
+    """,
+}
+# table names are constants of this module
+LOOKUPS = {
+    JSON_TABLE: f"SELECT count() FROM {JSON_TABLE} WHERE JSONExtractString(event_context, 'email') = {{email:String}}",  # noqa: S608
+    PROJECTED_TABLE: f'SELECT count() FROM {PROJECTED_TABLE} WHERE context_email = {{email:String}}',  # noqa: S608
+}
+
+
+def _columns(offset: int, count: int) -> list[list]:
+    from core.serialization import json_dumps
+
+    started = dt.datetime(2024, 1, 1)  # noqa: DTZ001
+    return [
+        ['user_created' if i % 10 else 'user_deleted' for i in range(offset, offset + count)],
+        [started + dt.timedelta(seconds=i) for i in range(offset, offset + count)],
+        ['Local'] * count,
+        [
+            json_dumps({'email': f'user_{i}@test.com', 'first_name': 'Bench', 'last_name': f'User{i}'})
+            for i in range(offset, offset + count)
+        ],
+        [1] * count,
+        [uuid.uuid4() for _ in range(count)],
+    ]
+
+
+def create_tables(client: Client) -> None:
+    for table, ddl in TABLES.items():
+        client.command(f'DROP TABLE IF EXISTS {table}')
+        client.command(ddl)
+
+
+def load(client: Client, rows: int, chunk_size: int = 100_000) -> None:
+    create_tables(client)
+    # both tables get the same rows, chunk by chunk
+    for offset in range(0, rows, chunk_size):
+        columns = _columns(offset, min(chunk_size, rows - offset))
+        for table in TABLES:
+            client.insert(table, columns, column_names=COLUMNS, column_oriented=True)
+    for table in TABLES:
+        client.command(f'OPTIMIZE TABLE {table} FINAL')
+
+
+def measure(client: Client, rows: int, repeat: int) -> dict:
+    email = f'user_{rows // 2}@test.com'
+    report = {}
+    for table, lookup in LOOKUPS.items():
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = client.query(lookup, parameters={'email': email})
+            timings.append(time.perf_counter() - started)
+        size = client.query(
+            'SELECT sum(bytes_on_disk) FROM system.parts WHERE active AND table = {table:String}',
+            parameters={'table': table},
+        ).result_rows[0][0]
+        report[table] = {
+            'bytes_on_disk': size,
+            'lookup_ms': round(statistics.median(timings) * 1000, 2),
+            'rows_read': int(result.summary.get('read_rows', 0)),
+            'matches': result.result_rows[0][0],
+        }
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--keep', action='store_true', help='Keep the scratch tables.')
+    args = parser.parse_args()
+
+    django.setup()
+    from core.event_log_client import EventLogClient
+
+    with EventLogClient.init() as event_log:
+        client = event_log._client
+        try:
+            load(client, args.rows)
+            for table, result in measure(client, args.rows, args.repeat).items():
+                print(  # noqa: T201
+                    f"{table:>26} {result['bytes_on_disk'] / 1024 / 1024:>9.1f} MB on disk "
+                    f"{result['lookup_ms']:>9} ms lookup {result['rows_read']:>10} rows read",
+                )
+        finally:
+            if not args.keep:
+                for table in TABLES:
+                    client.command(f'DROP TABLE IF EXISTS {table}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Peak memory of draining the outbox at different batch sizes.
+
+The outbox is seeded once per batch size in a throwaway test database and
+drained in a separate interpreter through the fake sink of
+benchmarks.outbox_pipeline, so the reported peaks belong to the drain alone.
+Rows are streamed in OUTBOX_STREAM_CHUNK_SIZE chunks, so the peak should
+stay flat as the batch size grows.
+
+    python -m benchmarks.drain_memory --rows 200000 --batch-sizes 1000 10000 100000
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tracemalloc
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+
+
+def run_case(batch_size: int, database_name: str) -> dict:
+    django.setup()
+    from django.conf import settings
+    from django.db import connection
+
+    from benchmarks.outbox_pipeline import drain
+
+    # the test database created by the parent process
+    settings.DATABASES['default']['NAME'] = database_name
+    connection.settings_dict['NAME'] = database_name
+
+    tracemalloc.start()
+    result = drain(batch_size, sink='fake')
+    _, peak = tracemalloc.get_traced_memory()
+    return {
+        'batch_size': batch_size,
+        'chunk_size': settings.OUTBOX_STREAM_CHUNK_SIZE,
+        'rows': result['rows'],
+        'seconds': round(result['seconds'], 4),
+        'peak_traced_mb': round(peak / 1024 / 1024, 1),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1000, 10_000, 100_000])
+    parser.add_argument('--case', nargs=2, metavar=('BATCH_SIZE', 'DATABASE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        batch_size, database_name = args.case
+        print(json.dumps(run_case(int(batch_size), database_name)))  # noqa: T201
+        return
+
+    django.setup()
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    from benchmarks.outbox_pipeline import seed_outbox
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        for batch_size in args.batch_sizes:
+            seed_outbox(args.rows)
+            output = subprocess.run(  # noqa: S603
+                [sys.executable, '-m', 'benchmarks.drain_memory', '--case', str(batch_size),
+                 connection.settings_dict['NAME']],
+                capture_output=True, text=True, check=True,
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(  # noqa: T201
+                f"{result['batch_size']:>9} batch {result['rows']:>9} rows "
+                f"{result['peak_traced_mb']:>8} MB traced {result['peak_rss_mb']:>8} MB peak RSS",
+            )
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Compare the transport compression methods of the event_log insert path:
+CPU spent serializing and compressing a batch against the bytes it puts on
+the wire.
+
+By default batches are only encoded, the way EventLogClient sends them,
+without a server. With --server they are inserted into a scratch copy of
+the event_log table, once per method, so the timings include the round
+trip and the server's decompression.
+
+    python -m benchmarks.insert_compression --rows 10000 --batches 20
+    python -m benchmarks.insert_compression --server
+"""
+import argparse
+import os
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+
+BENCH_TABLE = 'event_log_bench'
+METHODS = ('none', 'lz4', 'zstd', 'gzip')
+COLUMN_TYPES = ('String', 'DateTime64(6)', 'String', 'String', 'Int32', 'UUID')
+
+
+def _batch(count: int) -> list[list]:
+    from benchmarks.insert_formats import _outbox_rows
+    from core.serialization import json_dumps
+
+    columns = [list(column) for column in zip(*_outbox_rows(count), strict=False)]
+    columns[3] = [json_dumps(context) for context in columns[3]]
+    return columns
+
+
+def encode(method: str, batches: list[list[list]]) -> tuple[float, int]:
+    """CPU seconds and bytes to encode `batches` like an insert with `method` would."""
+    from clickhouse_connect.datatypes.registry import get_from_name
+    from clickhouse_connect.driver.insert import InsertContext
+
+    from core.event_log_client import EVENT_LOG_COLUMNS, WireMeteredTransform, transport_compression
+
+    transform = WireMeteredTransform()
+    column_types = [get_from_name(name) for name in COLUMN_TYPES]
+    started = time.process_time()
+    for columns in batches:
+        context = InsertContext(
+            BENCH_TABLE, EVENT_LOG_COLUMNS, column_types, data=columns, column_oriented=True,
+            compression=transport_compression(method),
+        )
+        for _ in transform.build_insert(context):
+            pass
+    return time.process_time() - started, transform.sent_bytes
+
+
+def insert(method: str, batches: list[list[list]]) -> tuple[float, int]:
+    """CPU seconds and wire bytes to insert `batches` into the scratch table with `method`."""
+    from django.test import override_settings
+
+    from core.event_log_client import EventLogClient, close_client_pool
+
+    close_client_pool()
+    with override_settings(CLICKHOUSE_EVENT_LOG_TABLE_NAME=BENCH_TABLE, CLICKHOUSE_INSERT_COMPRESSION=method):
+        with EventLogClient.init() as client:
+            started = time.process_time()
+            for columns in batches:
+                client.insert_columns(columns)
+            return time.process_time() - started, client.wire_bytes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10_000, help='Rows per batch.')
+    parser.add_argument('--batches', type=int, default=20)
+    parser.add_argument('--methods', nargs='+', default=list(METHODS))
+    parser.add_argument('--server', action='store_true', help='Insert into a scratch table instead of only encoding.')
+    args = parser.parse_args()
+
+    django.setup()
+    from django.conf import settings
+
+    from core.event_log_client import EventLogClient
+
+    batches = [_batch(args.rows) for _ in range(args.batches)]
+    run = insert if args.server else encode
+    if args.server:
+        with EventLogClient.init() as client:
+            client.command(f'DROP TABLE IF EXISTS {BENCH_TABLE}')
+            client.command(f'CREATE TABLE {BENCH_TABLE} AS {settings.CLICKHOUSE_EVENT_LOG_TABLE_NAME}')
+    try:
+        baseline = None
+        for method in args.methods:
+            cpu_seconds, wire_bytes = run(method, batches)
+            baseline = baseline or wire_bytes
+            print(  # noqa: T201
+                f'{method:>5} {wire_bytes / args.batches / 1024:>10.1f} KiB/batch '
+                f'{wire_bytes / baseline:>6.1%} of {args.methods[0]} '
+                f'{cpu_seconds / args.batches * 1000:>8.2f} ms CPU/batch',
+            )
+    finally:
+        if args.server:
+            with EventLogClient.init() as client:
+                client.command(f'DROP TABLE IF EXISTS {BENCH_TABLE}')
+
+
+if __name__ == '__main__':
+    main()
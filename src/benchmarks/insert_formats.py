@@ -0,0 +1,129 @@
+"""
+Compare the row and the column-oriented event_log insert paths.
+
+Every case runs in its own interpreter so peak RSS is not polluted by the
+previous one. Rows go to a scratch copy of the event_log table.
+
+    python -m benchmarks.insert_formats --rows 10000 100000 1000000
+"""
+import argparse
+import datetime as dt
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import uuid
+from typing import TYPE_CHECKING
+
+import django
+
+if TYPE_CHECKING:
+    from core.event_log_client import EventLogClient
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+
+BENCH_TABLE = 'event_log_bench'
+PATHS = ('row', 'columnar')
+
+
+def _outbox_rows(count: int) -> list[tuple]:
+    """Rows shaped like `OutboxLog.objects.values_list(*EVENT_LOG_COLUMNS)`."""
+    now = dt.datetime.now()  # noqa: DTZ005
+    return [
+        (
+            'user_created',
+            now,
+            'Local',
+            {'email': f'user_{i}@test.com', 'first_name': 'Bench', 'last_name': f'User{i}'},
+            1,
+            uuid.uuid4(),
+        )
+        for i in range(count)
+    ]
+
+
+def _insert_rows(client: 'EventLogClient', rows: list[tuple]) -> None:
+    client.insert(data=[
+        {
+            'event_type': event_type,
+            'event_date_time': event_date_time,
+            'environment': environment,
+            'event_context': event_context,
+            'metadata_version': metadata_version,
+            'event_id': event_id,
+        }
+        for event_type, event_date_time, environment, event_context, metadata_version, event_id in rows
+    ])
+
+
+def _insert_columns(client: 'EventLogClient', rows: list[tuple]) -> None:
+    client.insert_columns([list(column) for column in zip(*rows, strict=False)])
+
+
+def run_case(path: str, count: int) -> dict:
+    django.setup()
+    from django.test import override_settings
+
+    from core.event_log_client import EventLogClient
+
+    rows = _outbox_rows(count)
+    insert = _insert_rows if path == 'row' else _insert_columns
+    with override_settings(CLICKHOUSE_EVENT_LOG_TABLE_NAME=BENCH_TABLE), EventLogClient.init() as client:
+        started = time.perf_counter()
+        insert(client, rows)
+        elapsed = time.perf_counter() - started
+    return {
+        'path': path,
+        'rows': count,
+        'seconds': round(elapsed, 4),
+        'rows_per_second': round(count / elapsed),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def _prepare_table(drop: bool = False) -> None:
+    django.setup()
+    from django.conf import settings
+
+    from core.event_log_client import EventLogClient
+
+    with EventLogClient.init() as client:
+        client._client.command(f'DROP TABLE IF EXISTS {BENCH_TABLE}')
+        if not drop:
+            client._client.command(
+                f'CREATE TABLE {BENCH_TABLE} AS {settings.CLICKHOUSE_EVENT_LOG_TABLE_NAME}',
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--case', nargs=2, metavar=('PATH', 'ROWS'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        path, count = args.case
+        print(json.dumps(run_case(path, int(count))))  # noqa: T201
+        return
+
+    _prepare_table()
+    try:
+        for count in args.rows:
+            for path in PATHS:
+                output = subprocess.run(  # noqa: S603
+                    [sys.executable, '-m', 'benchmarks.insert_formats', '--case', path, str(count)],
+                    capture_output=True, text=True, check=True,
+                ).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                print(  # noqa: T201
+                    f"{result['path']:>9} {result['rows']:>9} rows "
+                    f"{result['rows_per_second']:>10} rows/s {result['peak_rss_mb']:>8} MB peak RSS",
+                )
+    finally:
+        _prepare_table(drop=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,286 @@
+"""
+Measure outbox draining end to end and per stage.
+
+Seeds N outbox rows into a throwaway test database, drains them batch by
+batch through the regular claim/fetch/insert/mark path and reports where
+the time goes:
+
+    fetch      claim the lease and read the batch from Postgres
+    serialize  encode the event context for ClickHouse
+    insert     send the batch to the sink
+    mark       mark the rows processed
+
+`--sink fake` replaces ClickHouse with an in-process sink that accepts
+everything, which isolates the Postgres and serialization cost; `--sink
+clickhouse` writes to the configured server (use a scratch
+CLICKHOUSE_EVENT_LOG_TABLE_NAME). `--engine pipelined` drains with
+logs.pipeline instead of the sequential drainer.
+
+    python -m benchmarks.outbox_pipeline --rows 100000 --output report.json
+    python -m benchmarks.outbox_pipeline --rows 100000 --compare report.json
+    python -m benchmarks.outbox_pipeline --rows 100000 --engine pipelined --compare report.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from collections.abc import Callable
+from contextlib import ExitStack
+from functools import partial
+from pathlib import Path
+from typing import TYPE_CHECKING
+from unittest import mock
+
+import django
+
+if TYPE_CHECKING:
+    from logs.services import BatchStats
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+
+STAGES = ('fetch', 'serialize', 'insert', 'mark')
+SEED_CHUNK_SIZE = 10_000
+
+
+class FakeInsertSummary:
+    def __init__(self, written_bytes: int) -> None:
+        self._written_bytes = written_bytes
+
+    def written_bytes(self) -> int:
+        return self._written_bytes
+
+
+class FakeQueryResult:
+    def __init__(self, result_rows: list[tuple]) -> None:
+        self.result_rows = result_rows
+
+
+class FakeSink:
+    """Accepts every insert like a clickhouse_connect client would, without the network."""
+
+    def insert(
+        self, data: list, column_names: list[str], column_oriented: bool = False, **_kwargs: object,
+    ) -> FakeInsertSummary:
+        columns = data if column_oriented else list(zip(*data, strict=False))
+        context = columns[column_names.index('event_context')]
+        return FakeInsertSummary(sum(len(value) for value in context))
+
+    def query(self, _query: str, **_kwargs: object) -> FakeQueryResult:
+        # the system.columns lookup of EventLogClient._projections: a fully migrated event_log
+        from core.event_log_client import EVENT_LOG_COLUMNS
+        from core.events import projected_columns
+
+        return FakeQueryResult([(column,) for column in [*EVENT_LOG_COLUMNS, *projected_columns()]])
+
+    def close(self) -> None:
+        pass
+
+
+class FakeClientPool:
+    def acquire(self) -> FakeSink:
+        return FakeSink()
+
+    def release(self, client: FakeSink, healthy: bool = True) -> None:
+        pass
+
+
+class SerializeTimer:
+    """Wraps EventLogClient._convert_columns to time the serialization stage."""
+
+    def __init__(self, convert_columns: Callable[[object, list[list]], list[list]]) -> None:
+        self._convert_columns = convert_columns
+        self.seconds = 0.0
+
+    def __call__(self, client: object, columns: list[list]) -> list[list]:
+        started = time.perf_counter()
+        try:
+            return self._convert_columns(client, columns)
+        finally:
+            self.seconds += time.perf_counter() - started
+
+    def __get__(self, client: object, owner: type | None = None) -> Callable[[list[list]], list[list]]:
+        # bind like the method it replaces
+        return self if client is None else partial(self, client)
+
+
+def seed_outbox(count: int) -> None:
+    from logs.models import OutboxLog
+
+    OutboxLog.objects.all().delete()
+    for offset in range(0, count, SEED_CHUNK_SIZE):
+        OutboxLog.objects.bulk_create(
+            OutboxLog(
+                event_type='user_created',
+                environment='Local',
+                event_context={'email': f'user_{i}@test.com', 'first_name': 'Bench', 'last_name': f'User{i}'},
+            )
+            for i in range(offset, min(offset + SEED_CHUNK_SIZE, count))
+        )
+
+
+def drain(batch_size: int, sink: str, engine: str = 'sync') -> dict:
+    from core.event_log_client import EventLogClient
+    from logs import services
+
+    timer = SerializeTimer(EventLogClient._convert_columns)
+    with ExitStack() as stack:
+        stack.enter_context(mock.patch.object(EventLogClient, '_convert_columns', timer))
+        if sink == 'fake':
+            stack.enter_context(mock.patch('core.event_log_client.get_client_pool', FakeClientPool))
+        started = time.perf_counter()
+        if engine == 'pipelined':
+            stats, rows, batches = _drain_pipelined(batch_size)
+        else:
+            stats, rows, batches = _drain_sync(batch_size, services.get_worker_id())
+        total = time.perf_counter() - started
+    # insert_seconds covers the serialization done inside the client;
+    # with the pipelined engine the stages overlap and add up to more than the total
+    stages = {
+        'fetch': stats.fetch_seconds,
+        'serialize': timer.seconds,
+        'insert': stats.insert_seconds - timer.seconds,
+        'mark': stats.mark_seconds,
+    }
+    return {
+        'rows': rows,
+        'batches': batches,
+        'payload_bytes': stats.payload_bytes,
+        'wire_bytes': stats.wire_bytes,
+        'seconds': total,
+        'rows_per_second': rows / total if total else 0,
+        'stages': stages,
+    }
+
+
+def _drain_sync(batch_size: int, worker_id: str) -> tuple['BatchStats', int, int]:
+    from logs import services
+
+    total = services.BatchStats()
+    rows = batches = 0
+    last_id = 0
+    while True:
+        stats = services._process_batch(batch_size, worker_id, after_id=last_id)
+        if not stats.log_ids:
+            return total, rows, batches
+        last_id = stats.log_ids[-1]
+        rows += len(stats.log_ids)
+        batches += 1
+        total.payload_bytes += stats.payload_bytes
+        total.wire_bytes += stats.wire_bytes
+        total.fetch_seconds += stats.fetch_seconds
+        total.insert_seconds += stats.insert_seconds
+        total.mark_seconds += stats.mark_seconds
+
+
+def _drain_pipelined(batch_size: int) -> tuple['BatchStats', int, int]:
+    from logs.pipeline import drain_pipelined
+    from logs.services import BatchStats
+
+    stats = BatchStats()
+    result = asyncio.run(drain_pipelined(batch_size, time_budget=float('inf'), stats=stats))
+    return stats, result.processed, result.batches
+
+
+def run(rows: int, batch_size: int, sink: str, engine: str, repeat: int) -> dict:
+    from logs.models import OutboxLog
+
+    runs = []
+    for _ in range(repeat):
+        seed_outbox(rows)
+        result = drain(batch_size, sink, engine)
+        if OutboxLog.objects.filter(processed=False).exists():
+            raise RuntimeError('benchmark run left unprocessed outbox rows')
+        runs.append(result)
+    return {
+        'meta': {
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'rows': rows,
+            'batch_size': batch_size,
+            'sink': sink,
+            'engine': engine,
+            'repeat': repeat,
+        },
+        'runs': runs,
+        'summary': _summarize(runs),
+    }
+
+
+def compare(report: dict, baseline: dict, threshold: float) -> list[str]:
+    """Metrics that got slower than `baseline` by more than `threshold` (a fraction)."""
+    regressions = []
+    for metric, value in report['summary'].items():
+        previous = baseline['summary'].get(metric)
+        if not previous:
+            continue
+        change = (previous - value) / previous if metric == 'rows_per_second' else (value - previous) / previous
+        print(f'{metric:>18} {previous:>12.4f} -> {value:>12.4f} ({change:+.1%})')  # noqa: T201
+        if change > threshold:
+            regressions.append(metric)
+    return regressions
+
+
+def _summarize(runs: list[dict]) -> dict:
+    summary = {
+        'seconds': statistics.median(run['seconds'] for run in runs),
+        'rows_per_second': statistics.median(run['rows_per_second'] for run in runs),
+    }
+    for stage in STAGES:
+        summary[f'{stage}_seconds'] = statistics.median(run['stages'][stage] for run in runs)
+    return summary
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(  # noqa: S603
+            ['git', 'rev-parse', '--short', 'HEAD'],  # noqa: S607
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--sink', choices=['fake', 'clickhouse'], default='fake')
+    parser.add_argument('--engine', choices=['sync', 'pipelined'], default='sync')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='Write the JSON report to this file.')
+    parser.add_argument('--compare', help='Baseline JSON report to check for regressions.')
+    parser.add_argument('--threshold', type=float, default=0.1, help='Allowed slowdown against the baseline.')
+    parser.add_argument('--keepdb', action='store_true', help='Reuse the test database between runs.')
+    args = parser.parse_args()
+
+    django.setup()
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, keepdb=args.keepdb)
+    try:
+        report = run(args.rows, args.batch_size, args.sink, args.engine, args.repeat)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=args.keepdb)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+    else:
+        print(output)  # noqa: T201
+
+    if args.compare:
+        regressions = compare(report, json.loads(Path(args.compare).read_text()), args.threshold)
+        if regressions:
+            print(f'regressed: {", ".join(regressions)}')  # noqa: T201
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
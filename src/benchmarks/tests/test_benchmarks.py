@@ -0,0 +1,31 @@
+import tracemalloc
+
+import pytest
+from django.db import connection
+
+from benchmarks.drain_memory import run_case
+from benchmarks.outbox_pipeline import drain, seed_outbox
+
+# the pipelined engine reads on its own connections, so the rows must be committed
+pytestmark = [pytest.mark.django_db(transaction=True)]
+
+
+@pytest.mark.parametrize("engine", ["sync", "pipelined"])
+def test_outbox_pipeline_drains_into_the_fake_sink(engine: str) -> None:
+    seed_outbox(25)
+
+    report = drain(10, sink="fake", engine=engine)
+
+    assert (report["rows"], report["batches"]) == (25, 3)
+    assert report["payload_bytes"] > 0
+
+
+def test_drain_memory_case_drains_into_the_fake_sink() -> None:
+    seed_outbox(25)
+
+    try:
+        result = run_case(10, connection.settings_dict["NAME"])
+    finally:
+        tracemalloc.stop()
+
+    assert result["rows"] == 25
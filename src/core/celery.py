@@ -1,5 +1,5 @@
 from celery import Celery
-from django.conf import settings
+from celery.signals import worker_init, worker_process_shutdown
 import os
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
@@ -8,8 +8,40 @@ app.config_from_object("django.conf:settings", namespace="CELERY")
 app.autodiscover_tasks()
 app.conf.beat_schedule = {
     "process-outbox-every-minute": {
-        "task": "logs.tasks.process_outbox_task",
+        "task": "logs.tasks.dispatch_outbox_task",
         "schedule": 60.0,  
-        "args": (settings.LOG_BATCH_SIZE,), 
+    },
+    "retry-dead-letters-every-minute": {
+        "task": "logs.tasks.retry_dead_letters_task",
+        "schedule": 60.0,
+    },
+    "purge-outbox-every-hour": {
+        "task": "logs.tasks.purge_outbox_task",
+        "schedule": 3600.0,
     },
 }
+
+
+@worker_init.connect
+def start_metrics_server(**kwargs):
+    from django.conf import settings
+    from prometheus_client import start_http_server
+
+    from core.metrics import SCRAPE_REGISTRY, is_multiprocess, process_registry
+    import logs.metrics  # registers the outbox collector
+
+    if not settings.CELERY_METRICS_PORT:
+        return
+    registry = process_registry()
+    if not is_multiprocess():
+        registry.register(SCRAPE_REGISTRY)
+    start_http_server(settings.CELERY_METRICS_PORT, registry=registry)
+
+
+@worker_process_shutdown.connect
+def close_clickhouse_clients(pid=None, **kwargs):
+    from core.event_log_client import close_client_pool
+    from core.metrics import mark_process_dead
+
+    close_client_pool()
+    mark_process_dead(pid or os.getpid())
@@ -0,0 +1,104 @@
+import time
+from typing import Any
+
+import structlog
+from django.conf import settings
+from django.core.cache import cache
+
+logger = structlog.get_logger(__name__)
+
+
+class CircuitBreaker:
+    """
+    Closed/open/half-open breaker whose state lives in the shared cache, so
+    every worker process stops calling a failing dependency at once.
+
+    After `failure_threshold` consecutive failures the breaker opens and
+    `allow` rejects calls. Once `recovery_timeout` seconds have passed it is
+    half-open and lets a single probe through; a successful probe closes it,
+    a failed one opens it again. For `ramp_up_seconds` after closing,
+    `scale` reports a reduced share of the normal load.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    MIN_RAMP = 0.1
+
+    def __init__(self, name: str, failure_threshold: int, recovery_timeout: float, ramp_up_seconds: float) -> None:
+        self.name = name
+        self._failure_threshold = failure_threshold
+        self._recovery_timeout = recovery_timeout
+        self._ramp_up_seconds = ramp_up_seconds
+        self._failures_key = f'circuit:{name}:failures'
+        self._opened_at_key = f'circuit:{name}:opened_at'
+        self._probe_key = f'circuit:{name}:probe'
+        self._closed_at_key = f'circuit:{name}:closed_at'
+        self._rejections_key = f'circuit:{name}:rejections'
+
+    @property
+    def state(self) -> str:
+        opened_at = cache.get(self._opened_at_key)
+        if opened_at is None:
+            return self.CLOSED
+        if time.time() - opened_at >= self._recovery_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and cache.add(self._probe_key, 1, timeout=self._recovery_timeout):
+            logger.info('circuit half-open, probing', circuit=self.name)
+            return True
+        self._incr(self._rejections_key)
+        return False
+
+    def record_success(self) -> None:
+        if cache.get(self._opened_at_key) is not None:
+            cache.set(self._closed_at_key, time.time(), timeout=self._ramp_up_seconds)
+            logger.info('circuit closed', circuit=self.name)
+        cache.delete_many([self._failures_key, self._opened_at_key, self._probe_key])
+
+    def record_failure(self) -> None:
+        if self.state != self.CLOSED:
+            # the half-open probe failed
+            self._open()
+            return
+        if self._incr(self._failures_key) >= self._failure_threshold:
+            self._open()
+
+    def scale(self, value: int) -> int:
+        """Scale `value` down while the dependency is recovering from an outage."""
+        closed_at = cache.get(self._closed_at_key)
+        if closed_at is None:
+            return value
+        ramp = max((time.time() - closed_at) / self._ramp_up_seconds, self.MIN_RAMP)
+        return max(int(value * min(ramp, 1.0)), 1)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            'state': self.state,
+            'failures': cache.get(self._failures_key, 0),
+            'rejections': cache.get(self._rejections_key, 0),
+        }
+
+    def _open(self) -> None:
+        cache.set(self._opened_at_key, time.time(), timeout=None)
+        cache.delete_many([self._probe_key, self._closed_at_key])
+        logger.warning('circuit opened', circuit=self.name, recovery_timeout=self._recovery_timeout)
+
+    def _incr(self, key: str) -> int:
+        cache.add(key, 0, timeout=None)
+        return cache.incr(key)
+
+
+def get_clickhouse_breaker() -> CircuitBreaker:
+    return CircuitBreaker(
+        'clickhouse',
+        failure_threshold=settings.CLICKHOUSE_BREAKER_FAILURE_THRESHOLD,
+        recovery_timeout=settings.CLICKHOUSE_BREAKER_RECOVERY_TIMEOUT,
+        ramp_up_seconds=settings.CLICKHOUSE_BREAKER_RAMP_UP_SECONDS,
+    )
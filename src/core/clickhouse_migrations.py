@@ -0,0 +1,201 @@
+import re
+from datetime import UTC, datetime
+from pathlib import Path
+from string import Template
+from typing import NamedTuple
+
+import structlog
+from django.conf import settings
+
+from core.event_log_client import EventLogClient
+from core.events import Projection, autodiscover_events, projected_columns
+
+logger = structlog.get_logger(__name__)
+
+MIGRATIONS_TABLE = 'schema_migrations'
+MIGRATION_FILE = re.compile(r'^(?P<version>\d+)_(?P<name>\w+)\.sql$')
+# mutations (MATERIALIZE, MODIFY COLUMN) are queued and run by the server in the
+# background; migrations return once they are accepted, not when they are done
+ONLINE_SETTINGS = {'mutations_sync': 0}
+# TTL changes apply to existing parts as they are merged, never in one rewrite
+TTL_SETTINGS = {**ONLINE_SETTINGS, 'materialize_ttl_after_modify': 0}
+# created by 0001_event_counts_rollups.sql
+ROLLUP_TABLES = ('event_counts_1m', 'event_counts_1h', 'event_counts_1d')
+TTL_CLAUSE = re.compile(r' TTL (?P<ttl>.+?)(?: SETTINGS |$)')
+
+
+def table_names() -> dict[str, str]:
+    """Values of the `$name` placeholders in migration files."""
+    return {'event_log': settings.CLICKHOUSE_EVENT_LOG_TABLE_NAME}
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    path: Path
+
+    def statements(self, applied_at: datetime | None = None) -> list[str]:
+        """
+        The file's statements, split on `;` at line ends, with `$event_log`
+        replaced by the configured table name and `$applied_at` by the UTC
+        time the migration is applied (now by default), the same in every
+        statement. Full-line `--` comments are dropped.
+        """
+        applied_at = (applied_at or datetime.now(UTC)).astimezone(UTC)
+        sql = Template(self.path.read_text()).safe_substitute(
+            table_names(), applied_at=applied_at.strftime('%Y-%m-%d %H:%M:%S'),
+        )
+        lines = [line for line in sql.splitlines() if not line.lstrip().startswith('--')]
+        return [statement.strip() for statement in re.split(r';\s*$', '\n'.join(lines), flags=re.MULTILINE)
+                if statement.strip()]
+
+
+def load_migrations(directory: Path | None = None) -> list[Migration]:
+    """Migrations in CLICKHOUSE_MIGRATIONS_DIR, named `<version>_<name>.sql`, in version order."""
+    directory = directory or Path(settings.CLICKHOUSE_MIGRATIONS_DIR)
+    migrations = []
+    for path in directory.iterdir():
+        if match := MIGRATION_FILE.match(path.name):
+            migrations.append(Migration(int(match['version']), match['name'], path))
+    migrations.sort()
+    versions = [migration.version for migration in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError(f'duplicate clickhouse migration versions in {directory}')
+    return migrations
+
+
+def applied_versions(client: EventLogClient) -> set[int]:
+    client.command(
+        f'CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} '
+        '(`version` UInt32, `name` String, `applied_at` DateTime DEFAULT now()) '
+        'ENGINE = MergeTree ORDER BY version',
+    )
+    return {row[0] for row in client.select(f'SELECT version FROM {MIGRATIONS_TABLE}')}  # noqa: S608
+
+
+def migrate(directory: Path | None = None) -> list[Migration]:
+    """
+    Apply pending migrations in version order and record each one once it
+    went through. Statements run one by one without a transaction, so a
+    failed migration is left partly applied; write them with IF NOT EXISTS
+    so they can be re-run after the cause is fixed.
+
+    Then brings event_log in line with the settings and the event registry:
+    projected columns and the retention TTL, which the rollups share.
+    """
+    migrations = load_migrations(directory)
+    applied = []
+    with EventLogClient.init() as client:
+        done = applied_versions(client)
+        for migration in migrations:
+            if migration.version in done:
+                continue
+            logger.info('applying clickhouse migration', version=migration.version, name=migration.name)
+            for statement in migration.statements():
+                client.command(statement, settings=ONLINE_SETTINGS)
+            client.command(
+                f'INSERT INTO {MIGRATIONS_TABLE} (version, name) VALUES ({{version:UInt32}}, {{name:String}})',  # noqa: S608
+                {'version': migration.version, 'name': migration.name},
+            )
+            applied.append(migration)
+        sync_projected_columns(client)
+        sync_ttl(client)
+    return applied
+
+
+def pending_mutations(client: EventLogClient) -> list[tuple]:
+    """Background mutations still running on the schema's tables: (table, mutation_id, command, parts_to_do)."""
+    return client.select(
+        'SELECT table, mutation_id, command, parts_to_do FROM system.mutations '
+        'WHERE database = {database:String} AND NOT is_done ORDER BY create_time',
+        {'database': settings.CLICKHOUSE_SCHEMA},
+    )
+
+
+def sync_ttl(client: EventLogClient) -> str | None:
+    """
+    Set the TTL of event_log and of its count rollups to
+    CLICKHOUSE_EVENT_LOG_TTL_DAYS, or remove it when 0, so counts age out
+    of the rollups together with the events they were built from. Existing
+    parts are not rewritten: expired rows go at the next merges, on
+    event_log with `ttl_only_drop_parts` only once a whole part has
+    expired, which drops it without rewriting anything. The rollups are
+    small enough to rewrite on merge. Returns event_log's TTL expression.
+    """
+    days = settings.CLICKHOUSE_EVENT_LOG_TTL_DAYS
+    # the server keeps the expression normalized, INTERVAL n DAY reads back as toIntervalDay(n)
+    ttl = f'toDateTime(event_date_time) + toIntervalDay({days})' if days else None
+    _sync_table_ttl(client, settings.CLICKHOUSE_EVENT_LOG_TABLE_NAME, ttl, drop_parts=True)
+    for table in ROLLUP_TABLES:
+        _sync_table_ttl(client, table, f'bucket + toIntervalDay({days})' if days else None)
+    return ttl
+
+
+def _sync_table_ttl(client: EventLogClient, table: str, ttl: str | None, drop_parts: bool = False) -> None:
+    rows = client.select(
+        'SELECT engine_full FROM system.tables WHERE database = {database:String} AND name = {table:String}',
+        {'database': settings.CLICKHOUSE_SCHEMA, 'table': table},
+    )
+    # the rollups are missing until 0001_event_counts_rollups.sql is applied
+    if not rows or _table_ttl(rows[0][0]) == ttl:
+        return
+    if ttl is None:
+        _remove_ttl(client, table, drop_parts)
+    else:
+        _set_ttl(client, table, ttl, drop_parts)
+
+
+def _set_ttl(client: EventLogClient, table: str, ttl: str, drop_parts: bool) -> None:
+    logger.info('setting clickhouse ttl', table=table, ttl=ttl)
+    if drop_parts:
+        client.command(f'ALTER TABLE {table} MODIFY SETTING ttl_only_drop_parts = 1')
+    client.command(f'ALTER TABLE {table} MODIFY TTL {ttl}', settings=TTL_SETTINGS)
+
+
+def _remove_ttl(client: EventLogClient, table: str, drop_parts: bool) -> None:
+    logger.info('removing clickhouse ttl', table=table)
+    client.command(f'ALTER TABLE {table} REMOVE TTL', settings=TTL_SETTINGS)
+    if drop_parts:
+        client.command(f'ALTER TABLE {table} RESET SETTING ttl_only_drop_parts')
+
+
+def _table_ttl(engine_full: str) -> str | None:
+    match = TTL_CLAUSE.search(engine_full)
+    return match['ttl'] if match else None
+
+
+def sync_projected_columns(client: EventLogClient) -> list[Projection]:
+    """
+    Add the typed columns (and bloom filter indexes) of projected event
+    fields that event_log does not have yet, and fill them for existing
+    rows. Columns default to extracting the field from event_context, so
+    rows written without them stay correct. Returns the added projections.
+    """
+    autodiscover_events()
+    table = settings.CLICKHOUSE_EVENT_LOG_TABLE_NAME
+    parameters = {'database': settings.CLICKHOUSE_SCHEMA, 'table': table}
+    columns = {row[0] for row in client.select(
+        'SELECT name FROM system.columns WHERE database = {database:String} AND table = {table:String}', parameters,
+    )}
+    indexes = {row[0] for row in client.select(
+        'SELECT name FROM system.data_skipping_indices WHERE database = {database:String} AND table = {table:String}',
+        parameters,
+    )}
+    added = []
+    for column, projection in projected_columns().items():
+        if column not in columns:
+            logger.info('adding projected clickhouse column', column=column)
+            client.command(
+                f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS `{column}` {projection.clickhouse_type} '
+                f'DEFAULT {projection.default_expression}',
+            )
+            client.command(f'ALTER TABLE {table} MATERIALIZE COLUMN `{column}`', settings=ONLINE_SETTINGS)
+            added.append(projection)
+        index = f'{column}_bloom'
+        if projection.indexed and index not in indexes:
+            client.command(
+                f'ALTER TABLE {table} ADD INDEX IF NOT EXISTS `{index}` `{column}` '
+                'TYPE bloom_filter(0.01) GRANULARITY 4',
+            )
+            client.command(f'ALTER TABLE {table} MATERIALIZE INDEX `{index}`', settings=ONLINE_SETTINGS)
+    return added
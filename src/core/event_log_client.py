@@ -1,13 +1,26 @@
-import re, json
-from collections.abc import Generator
+import hashlib
+import os
+import threading
+import time
+from collections.abc import Callable, Generator, Iterator, Sequence
 from contextlib import contextmanager
 from typing import Any
-from clickhouse_connect.driver import Client
+
 import clickhouse_connect
 import structlog
-from clickhouse_connect.driver.exceptions import DatabaseError
+from clickhouse_connect.driver import Client
+from clickhouse_connect.driver.compression import available_compression
+from clickhouse_connect.driver.exceptions import DatabaseError, OperationalError
+from clickhouse_connect.driver.insert import InsertContext
+from clickhouse_connect.driver.summary import QuerySummary
+from clickhouse_connect.driver.transform import NativeTransform
 from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
 from core.base_model import Model
+from core.events import Projection, projected_columns, to_snake_case
+from core.metrics import CLICKHOUSE_CLIENT_SETUP_SECONDS, CLICKHOUSE_CLIENTS_CREATED, CLICKHOUSE_CLIENTS_REUSED
+from core.serialization import json_dumps
 
 logger = structlog.get_logger(__name__)
 
@@ -17,16 +30,109 @@ EVENT_LOG_COLUMNS = [
     'environment',
     'event_context',
     'metadata_version',
+    'event_id',
 ]
 
 
-class EventLogClient:
-    def __init__(self, client: Client) -> None:
-        self._client = client
+def transport_compression(value: str) -> str | bool:
+    """A CLICKHOUSE_*_COMPRESSION setting as clickhouse_connect takes it, False for 'none'."""
+    if value == 'none':
+        return False
+    if value not in available_compression:
+        raise ImproperlyConfigured(
+            f'unsupported clickhouse compression {value!r}, use none or one of {", ".join(available_compression)}',
+        )
+    return value
 
-    @classmethod
-    @contextmanager
-    def init(cls) -> Generator['EventLogClient']:
+
+class WireMeteredTransform(NativeTransform):
+    """
+    Counts the insert body bytes after compression, the bytes actually sent
+    to the server. The server only reports the uncompressed `written_bytes`.
+    """
+
+    def __init__(self) -> None:
+        self.sent_bytes = 0
+
+    def build_insert(self, context: InsertContext) -> Iterator[bytes]:
+        return self._metered(super().build_insert(context))
+
+    def _metered(self, chunks: Iterator[bytes]) -> Iterator[bytes]:
+        for chunk in chunks:
+            self.sent_bytes += len(chunk)
+            yield chunk
+
+
+class ClickHouseClientPool:
+    """
+    Keeps up to `size` connected clients so tasks in the same process reuse
+    the HTTP session and skip the server version/settings handshake. Clients
+    idle for longer than `health_check_interval` are pinged before reuse.
+    """
+
+    def __init__(self, size: int, timeout: float, health_check_interval: float) -> None:
+        self._size = size
+        self._timeout = timeout
+        self._health_check_interval = health_check_interval
+        # most recently released last, so reuse keeps the warmest sessions
+        self._idle: list[tuple[Client, float]] = []
+        self._lock = threading.Lock()
+        # notified whenever a client is released or a connection slot frees up
+        self._available = threading.Condition(self._lock)
+        self._open = 0
+        self._stats = {
+            'created': 0,
+            'reused': 0,
+            'discarded': 0,
+            'setup_seconds': 0.0,
+        }
+
+    @property
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {**self._stats, 'open': self._open, 'idle': len(self._idle), 'size': self._size}
+
+    def acquire(self) -> Client:
+        while True:
+            idle = self._take_idle_or_reserve()
+            if idle is None:
+                return self._connect()
+            client, released_at = idle
+            if self._is_healthy(client, released_at):
+                self._incr('reused')
+                return client
+            self._discard(client)
+
+    def release(self, client: Client, healthy: bool = True) -> None:
+        if not healthy:
+            self._discard(client)
+            return
+        with self._lock:
+            self._idle.append((client, time.monotonic()))
+            self._available.notify()
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for client, _ in idle:
+            self._discard(client)
+        logger.info('clickhouse client pool closed', **self.stats)
+
+    def _take_idle_or_reserve(self) -> tuple[Client, float] | None:
+        """
+        The most recently released idle client, or None with a connection slot
+        reserved for a new one. Waits up to `timeout` for either.
+        """
+        with self._lock:
+            if not self._available.wait_for(lambda: self._idle or self._open < self._size, self._timeout):
+                raise OperationalError('timed out waiting for a pooled clickhouse client')
+            if self._idle:
+                return self._idle.pop()
+            self._open += 1
+            return None
+
+    def _connect(self) -> Client:
+        started = time.monotonic()
         try:
             client = clickhouse_connect.get_client(
                 host=settings.CLICKHOUSE_HOST,
@@ -35,56 +141,295 @@ class EventLogClient:
                 password=settings.CLICKHOUSE_PASSWORD,
                 database=settings.CLICKHOUSE_SCHEMA,
                 query_retries=2,
-                connect_timeout=30,
+                connect_timeout=settings.CLICKHOUSE_CONNECT_TIMEOUT,
                 send_receive_timeout=10,
+                compress=transport_compression(settings.CLICKHOUSE_QUERY_COMPRESSION),
             )
-            print("Connection successful")
+            # inserts are compressed on the worker's CPU, query results on the server's,
+            # so each direction gets its own method
+            client.write_compression = transport_compression(settings.CLICKHOUSE_INSERT_COMPRESSION)
+            # the transform is the one place the compressed insert body passes through
+            client._transform = WireMeteredTransform()
+        except Exception as e:
+            with self._lock:
+                self._open -= 1
+                self._available.notify()
+            logger.error('unable to connect to clickhouse', error=str(e))
+            raise
+        setup_seconds = time.monotonic() - started
+        with self._lock:
+            self._stats['created'] += 1
+            self._stats['setup_seconds'] += setup_seconds
+        CLICKHOUSE_CLIENTS_CREATED.inc()
+        CLICKHOUSE_CLIENT_SETUP_SECONDS.observe(setup_seconds)
+        return client
+
+    def _is_healthy(self, client: Client, released_at: float) -> bool:
+        if time.monotonic() - released_at < self._health_check_interval:
+            return True
+        return client.ping()
+
+    def _discard(self, client: Client) -> None:
+        try:
+            client.close()
         except Exception as e:
-            print(f"Connecton failed: {e}")
+            logger.warning('failed to close clickhouse client', error=str(e))
+        with self._lock:
+            self._open -= 1
+            self._stats['discarded'] += 1
+            self._available.notify()
+
+    def _incr(self, stat: str) -> None:
+        with self._lock:
+            self._stats[stat] += 1
+        if stat == 'reused':
+            CLICKHOUSE_CLIENTS_REUSED.inc()
+
+
+# event_log columns per table, looked up again after TABLE_COLUMNS_TTL seconds
+TABLE_COLUMNS_TTL = 60.0
+_table_columns: dict[str, tuple[float, frozenset[str]]] = {}
+
+_pool: ClickHouseClientPool | None = None
+_pool_pid: int | None = None
+_pool_lock = threading.Lock()
+
+
+def get_client_pool() -> ClickHouseClientPool:
+    """Return the pool of the current process, creating a fresh one after fork."""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ClickHouseClientPool(
+                size=settings.CLICKHOUSE_POOL_SIZE,
+                timeout=settings.CLICKHOUSE_POOL_TIMEOUT,
+                health_check_interval=settings.CLICKHOUSE_POOL_HEALTH_CHECK_INTERVAL,
+            )
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def close_client_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.close()
+        _pool = None
+
+
+class EventLogClient:
+    def __init__(self, client: Client) -> None:
+        self._client = client
+        # uncompressed bytes the server reported written by this client's inserts
+        self.written_bytes = 0
+        # compressed bytes sent for them
+        self.wire_bytes = 0
+
+    @classmethod
+    @contextmanager
+    def init(cls) -> Generator['EventLogClient']:
+        pool = get_client_pool()
+        client = pool.acquire()
+        healthy = True
         try:
             yield cls(client)
         except Exception as e:
+            # connection level failures leave the client in an unknown state
+            healthy = not isinstance(e, OperationalError)
             logger.error('error while executing clickhouse query', error=str(e))
             raise
         finally:
-            client.close()
+            pool.release(client, healthy=healthy)
 
     def insert(
         self,
         data: list[Model],
     ) -> None:
+        projections = self._projections()
+        self._insert(
+            self._convert_data(data, projections),
+            [event['event_id'] for event in data],
+            column_names=EVENT_LOG_COLUMNS + [projection.column for projection in projections],
+        )
+
+    def insert_columns(self, columns: list[list[Any]]) -> None:
+        """Insert per-column lists ordered like EVENT_LOG_COLUMNS, skipping the row transpose."""
+        event_ids = columns[EVENT_LOG_COLUMNS.index('event_id')]
+        contexts = columns[EVENT_LOG_COLUMNS.index('event_context')]
+        projections = self._projections()
+        self._insert(
+            self._convert_columns(columns) + [[projection.extract(context) for context in contexts]
+                                              for projection in projections],
+            event_ids,
+            column_names=EVENT_LOG_COLUMNS + [projection.column for projection in projections],
+            column_oriented=True,
+        )
+
+    def _insert(
+        self, data: list, event_ids: list[Any], column_names: list[str], column_oriented: bool = False,
+    ) -> None:
+        sent_bytes = self._sent_bytes()
         try:
-            self._client.insert(
-                data=self._convert_data(data),
-                column_names=EVENT_LOG_COLUMNS,
+            summary = self._client.insert(
+                data=data,
+                column_names=column_names,
                 database=settings.CLICKHOUSE_SCHEMA,
                 table=settings.CLICKHOUSE_EVENT_LOG_TABLE_NAME,
+                column_oriented=column_oriented,
+                settings=self._insert_settings(event_ids),
             )
         except DatabaseError as e:
             logger.error('unable to insert data to clickhouse', error=str(e))
+            raise
+        self.written_bytes += summary.written_bytes()
+        self.wire_bytes += self._sent_bytes() - sent_bytes
+
+    def _sent_bytes(self) -> int:
+        transform = getattr(self._client, '_transform', None)
+        return transform.sent_bytes if isinstance(transform, WireMeteredTransform) else 0
+
+    def _insert_settings(self, event_ids: list[Any]) -> dict[str, Any]:
+        # a retried batch carries the same events, so the server drops it as a duplicate
+        insert_settings = {'insert_deduplication_token': self._deduplication_token(event_ids)}
+        if settings.CLICKHOUSE_INSERT_MODE != 'async':
+            return insert_settings
+        # with wait_for_async_insert the insert returns once the server buffer is flushed,
+        # so marking the outbox rows processed afterwards stays safe
+        return {
+            **insert_settings,
+            'async_insert': 1,
+            'async_insert_deduplicate': 1,
+            'wait_for_async_insert': int(settings.CLICKHOUSE_ASYNC_INSERT_WAIT),
+        }
 
-    def _convert_data(self, data: list[Model]) -> list[tuple[Any]]:
+    def _deduplication_token(self, event_ids: list[Any]) -> str:
+        digest = hashlib.sha256()
+        for event_id in sorted(str(event_id) for event_id in event_ids):
+            digest.update(event_id.encode())
+        return digest.hexdigest()
+
+    def _convert_columns(self, columns: list[list[Any]]) -> list[list[Any]]:
+        context_index = EVENT_LOG_COLUMNS.index('event_context')
+        return [
+            [json_dumps(value) for value in column] if index == context_index else column
+            for index, column in enumerate(columns)
+        ]
+
+    def _convert_data(self, data: list[Model], projections: list[Projection]) -> list[tuple[Any]]:
         return [
             (
                 event['event_type'],
                 event['event_date_time'],
                 event['environment'],
-                json.dumps(event['event_context']),
+                json_dumps(event['event_context']),
                 event['metadata_version'],
+                event['event_id'],
+                *(projection.extract(event['event_context']) for projection in projections),
             )
             for event in data
         ]
 
-    def query(self, query: str) -> Any:  
+    def _projections(self) -> list[Projection]:
+        """
+        Projections of the registered events whose column exists in event_log.
+        Until `migrate_clickhouse` adds a column, inserts leave it out.
+        """
+        projections = projected_columns()
+        if not projections:
+            return []
+        columns = self._table_columns()
+        return [projection for column, projection in projections.items() if column in columns]
+
+    def _table_columns(self) -> frozenset[str]:
+        table = settings.CLICKHOUSE_EVENT_LOG_TABLE_NAME
+        cached = _table_columns.get(table)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+        rows = self._client.query(
+            'SELECT name FROM system.columns WHERE database = {database:String} AND table = {table:String}',
+            parameters={'database': settings.CLICKHOUSE_SCHEMA, 'table': table},
+        ).result_rows
+        columns = frozenset(row[0] for row in rows)
+        _table_columns[table] = (time.monotonic() + TABLE_COLUMNS_TTL, columns)
+        return columns
+
+    def select(self, query: str, parameters: dict[str, Any] | None = None) -> list[tuple]:
+        """Run a query with server-side bound `{name:Type}` parameters. Unlike `query`, errors are raised."""
+        logger.debug('executing clickhouse query', query=query)
+        return self._client.query(query, parameters=parameters).result_rows
+
+    def command(
+        self, statement: str, parameters: dict[str, Any] | None = None, settings: dict[str, Any] | None = None,
+    ) -> str | int | Sequence[str] | QuerySummary:
+        """Run a statement that returns no rows (DDL, INSERT ... SELECT). Errors are raised."""
+        logger.debug('executing clickhouse command', statement=statement)
+        return self._client.command(statement, parameters=parameters, settings=settings)
+
+    @contextmanager
+    def stream(
+        self, query: str, parameters: dict[str, Any] | None = None, column_oriented: bool = False,
+    ) -> Generator[Iterator[Sequence]]:
+        """Like `select`, but yield the result in blocks of rows (or of columns) as they arrive."""
+        logger.debug('streaming clickhouse query', query=query)
+        stream = self._client.query_column_block_stream if column_oriented else self._client.query_row_block_stream
+        with stream(query, parameters=parameters) as blocks:
+            yield blocks
+
+    def query(self, query: str) -> Any:
         logger.debug('executing clickhouse query', query=query)
 
         try:
             return self._client.query(query).result_rows
         except DatabaseError as e:
             logger.error('failed to execute clickhouse query', error=str(e))
-            return    
+            return
 
     def _to_snake_case(self, event_name: str) -> str:
-        result = re.sub('(.)([A-Z][a-z]+)', r'\1_\2', event_name)
-        return re.sub('([a-z0-9])([A-Z])', r'\1_\2', result).lower()
+        return to_snake_case(event_name)
+
+
+class EventLogBuffer:
+    """
+    Coalesces column batches on the client until `max_rows` rows are pending
+    or the oldest one is `max_age` seconds old, then hands them to `on_flush`
+    as one batch together with the keys passed to `add`.
+    """
+
+    def __init__(self, max_rows: int, max_age: float, on_flush: Callable[[list[list[Any]], list[Any]], None]) -> None:
+        self._max_rows = max_rows
+        self._max_age = max_age
+        self._on_flush = on_flush
+        self._columns: list[list[Any]] = [[] for _ in EVENT_LOG_COLUMNS]
+        self._keys: list[Any] = []
+        self._first_added_at: float | None = None
+
+    def __len__(self) -> int:
+        return len(self._columns[0])
+
+    @property
+    def keys(self) -> list[Any]:
+        return self._keys
+
+    def add(self, columns: list[list[Any]], keys: list[Any]) -> bool:
+        """Buffer a column batch with one key per row and flush if it became due. Returns whether it flushed."""
+        for pending, column in zip(self._columns, columns, strict=False):
+            pending.extend(column)
+        self._keys.extend(keys)
+        self._first_added_at = self._first_added_at or time.monotonic()
+        if self.is_due():
+            self.flush()
+            return True
+        return False
+
+    def is_due(self) -> bool:
+        if not self:
+            return False
+        return len(self) >= self._max_rows or time.monotonic() - self._first_added_at >= self._max_age
 
+    def flush(self) -> None:
+        if not self:
+            return
+        self._on_flush(self._columns, self._keys)
+        self._columns = [[] for _ in EVENT_LOG_COLUMNS]
+        self._keys = []
+        self._first_added_at = None
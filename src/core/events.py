@@ -0,0 +1,148 @@
+import re
+from collections.abc import Callable
+from functools import lru_cache
+from typing import Any, NamedTuple
+
+from django.utils.module_loading import autodiscover_modules
+
+from core.base_model import Model
+
+ProjectedValue = str | int | float | bool
+
+# python type of a projected field: ClickHouse type, zero value, JSON extraction function
+PROJECTION_TYPES = {
+    str: ('String', '', 'JSONExtractString'),
+    int: ('Int64', 0, 'JSONExtractInt'),
+    float: ('Float64', 0.0, 'JSONExtractFloat'),
+    bool: ('Bool', False, 'JSONExtractBool'),
+}
+
+
+class Projection(NamedTuple):
+    """An event_context field copied into a typed event_log column of its own."""
+
+    field: str
+    python_type: type
+    indexed: bool = False
+
+    @property
+    def column(self) -> str:
+        return f'context_{self.field}'
+
+    @property
+    def clickhouse_type(self) -> str:
+        return PROJECTION_TYPES[self.python_type][0]
+
+    @property
+    def zero(self) -> ProjectedValue:
+        return PROJECTION_TYPES[self.python_type][1]
+
+    @property
+    def default_expression(self) -> str:
+        return f"{PROJECTION_TYPES[self.python_type][2]}(event_context, '{self.field}')"
+
+    def extract(self, context: object) -> ProjectedValue:
+        value = context.get(self.field, self.zero) if isinstance(context, dict) else self.zero
+        # like the JSONExtract default expression, a value of another type becomes the zero value
+        return value if type(value) is self.python_type else self.zero
+
+
+class RegisteredEvent(NamedTuple):
+    name: str
+    version: int
+    projections: tuple[Projection, ...] = ()
+
+    def serialize(self, event: Model) -> dict[str, Any]:
+        """Dump an event to JSON-compatible python, the event_context of its outbox row."""
+        return event.model_dump(mode='json')
+
+
+_registry: dict[type[Model], RegisteredEvent] = {}
+
+
+@lru_cache(maxsize=1024)
+def to_snake_case(event_name: str) -> str:
+    result = re.sub('(.)([A-Z][a-z]+)', r'\1_\2', event_name)
+    return re.sub('([a-z0-9])([A-Z])', r'\1_\2', result).lower()
+
+
+def register_event(
+    name: str | None = None, version: int = 1, projected: tuple[str, ...] = (), indexed: tuple[str, ...] = (),
+) -> Callable[[type[Model]], type[Model]]:
+    """
+    Register an event model under `name` (snake cased class name by default).
+    The serialization schema is checked here, so an event that can not be
+    stored as event_context JSON fails at import rather than when emitted.
+
+    `projected` fields are also stored in typed `context_<field>` event_log
+    columns, so they can be filtered on without parsing event_context;
+    `indexed` ones get a bloom filter skipping index as well. Both are
+    created by `manage.py migrate_clickhouse`.
+    """
+    def decorator(event_cls: type[Model]) -> type[Model]:
+        event_name = name or to_snake_case(event_cls.__name__)
+        _check_unique(event_cls, event_name, version)
+        # fails for fields that can not be represented in the event_context JSON
+        event_cls.model_json_schema(mode='serialization')
+        projections = _projections(event_cls, projected, indexed)
+        _registry[event_cls] = RegisteredEvent(name=event_name, version=version, projections=projections)
+        return event_cls
+
+    return decorator
+
+
+def _check_unique(event_cls: type[Model], event_name: str, version: int) -> None:
+    if version < 1:
+        raise ValueError(f'event {event_name} version must be positive, got {version}')
+    for registered_cls, registered in _registry.items():
+        if registered.name == event_name and registered.version == version and registered_cls is not event_cls:
+            raise ValueError(f'event {event_name} v{version} is already registered by {registered_cls.__name__}')
+
+
+def get_event(event_cls: type[Model]) -> RegisteredEvent:
+    try:
+        return _registry[event_cls]
+    except KeyError:
+        raise LookupError(f'{event_cls.__name__} is not a registered event') from None
+
+
+def registered_events() -> dict[type[Model], RegisteredEvent]:
+    return dict(_registry)
+
+
+def autodiscover_events() -> None:
+    """Import the `use_cases` module of every installed app, registering their events."""
+    autodiscover_modules('use_cases')
+
+
+def projected_columns() -> dict[str, Projection]:
+    """Projections of all registered events by column; events sharing a field share its column."""
+    columns: dict[str, Projection] = {}
+    for registered in _registry.values():
+        for projection in registered.projections:
+            if projection.column in columns:
+                # indexed as soon as one of the events asks for it
+                projection = projection._replace(indexed=projection.indexed or columns[projection.column].indexed)
+            columns[projection.column] = projection
+    return columns
+
+
+def _projections(
+    event_cls: type[Model], projected: tuple[str, ...], indexed: tuple[str, ...],
+) -> tuple[Projection, ...]:
+    if not set(indexed) <= set(projected):
+        raise ValueError(f'{event_cls.__name__}: indexed fields must be projected')
+    existing = projected_columns()
+    return tuple(_projection(event_cls, field, field in indexed, existing) for field in projected)
+
+
+def _projection(event_cls: type[Model], field: str, indexed: bool, existing: dict[str, Projection]) -> Projection:
+    if field not in event_cls.model_fields:
+        raise ValueError(f'{event_cls.__name__} has no field {field} to project')
+    python_type = event_cls.model_fields[field].annotation
+    if python_type not in PROJECTION_TYPES:
+        raise ValueError(f'{event_cls.__name__}.{field}: can not project {python_type}')
+    projection = Projection(field, python_type, indexed=indexed)
+    if projection.column in existing and existing[projection.column].python_type is not python_type:
+        raise ValueError(f'{event_cls.__name__}.{field}: {projection.column} is projected with another type')
+    return projection
@@ -0,0 +1,47 @@
+import os
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# collectors computed at scrape time (database gauges, shared cache state);
+# kept apart from process metrics so multiprocess aggregation does not duplicate them
+SCRAPE_REGISTRY = CollectorRegistry(auto_describe=True)
+
+CLICKHOUSE_CLIENTS_CREATED = Counter(
+    'clickhouse_clients_created_total', 'ClickHouse clients connected by the client pool',
+)
+CLICKHOUSE_CLIENTS_REUSED = Counter(
+    'clickhouse_clients_reused_total', 'ClickHouse clients handed out again by the client pool',
+)
+CLICKHOUSE_CLIENT_SETUP_SECONDS = Histogram(
+    'clickhouse_client_setup_seconds', 'Time spent connecting a new ClickHouse client',
+)
+
+
+def is_multiprocess() -> bool:
+    return 'PROMETHEUS_MULTIPROC_DIR' in os.environ
+
+
+def process_registry() -> CollectorRegistry:
+    """Metrics of this process, or of every process sharing PROMETHEUS_MULTIPROC_DIR."""
+    if not is_multiprocess():
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def render_metrics() -> tuple[bytes, str]:
+    return generate_latest(process_registry()) + generate_latest(SCRAPE_REGISTRY), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: int) -> None:
+    if is_multiprocess():
+        multiprocess.mark_process_dead(pid)
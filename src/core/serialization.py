@@ -0,0 +1,31 @@
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+def json_dumps(value: object) -> str:
+    if orjson is not None:
+        return orjson.dumps(value).decode()
+    return json.dumps(value, separators=(',', ':'))
+
+
+def json_loads(value: str | bytes) -> Any:  # noqa: ANN401 any JSON value
+    if orjson is not None:
+        return orjson.loads(value)
+    return json.loads(value)
+
+
+def decode_event_context(value: str | bytes) -> dict[str, Any]:
+    """
+    Decode an event_log.event_context value. Rows written before the
+    single-encode pipeline hold a JSON string literal wrapping the payload,
+    so those are unwrapped once more.
+    """
+    decoded = json_loads(value)
+    if isinstance(decoded, str):
+        decoded = json_loads(decoded)
+    return decoded
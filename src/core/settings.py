@@ -95,8 +95,75 @@ CLICKHOUSE_URI = (
     f'clickhouse://{CLICKHOUSE_USER}:{CLICKHOUSE_PASSWORD}@{CLICKHOUSE_HOST}:{CLICKHOUSE_PORT}/{CLICKHOUSE_SCHEMA}?protocol='
     f'{CLICKHOUSE_PROTOCOL}'
 )
-CLICKHOUSE_EVENT_LOG_TABLE_NAME = 'event_log'
+CLICKHOUSE_EVENT_LOG_TABLE_NAME = env('CLICKHOUSE_EVENT_LOG_TABLE_NAME', default='event_log')
+# event_log retention applied by migrate_clickhouse as a table TTL, kept forever when 0
+CLICKHOUSE_EVENT_LOG_TTL_DAYS = env.int('CLICKHOUSE_EVENT_LOG_TTL_DAYS', default=0)
+# per-process pool of ClickHouse clients reused across tasks
+CLICKHOUSE_POOL_SIZE = env.int('CLICKHOUSE_POOL_SIZE', default=4)
+CLICKHOUSE_POOL_TIMEOUT = env.float('CLICKHOUSE_POOL_TIMEOUT', default=10.0)
+CLICKHOUSE_POOL_HEALTH_CHECK_INTERVAL = env.float('CLICKHOUSE_POOL_HEALTH_CHECK_INTERVAL', default=30.0)
+CLICKHOUSE_CONNECT_TIMEOUT = env.float('CLICKHOUSE_CONNECT_TIMEOUT', default=5.0)
+# circuit breaker shared by all workers through the cache
+CLICKHOUSE_BREAKER_FAILURE_THRESHOLD = env.int('CLICKHOUSE_BREAKER_FAILURE_THRESHOLD', default=3)
+CLICKHOUSE_BREAKER_RECOVERY_TIMEOUT = env.float('CLICKHOUSE_BREAKER_RECOVERY_TIMEOUT', default=30.0)
+CLICKHOUSE_BREAKER_RAMP_UP_SECONDS = env.float('CLICKHOUSE_BREAKER_RAMP_UP_SECONDS', default=120.0)
+# 'sync' creates a part per insert, 'async' lets the server batch inserts (async_insert)
+CLICKHOUSE_INSERT_MODE = env('CLICKHOUSE_INSERT_MODE', default='sync')
+CLICKHOUSE_ASYNC_INSERT_WAIT = env.bool('CLICKHOUSE_ASYNC_INSERT_WAIT', default=True)
+# client side coalescing of drained batches, disabled when max rows is 0
+CLICKHOUSE_BUFFER_MAX_ROWS = env.int('CLICKHOUSE_BUFFER_MAX_ROWS', default=0)
+CLICKHOUSE_BUFFER_MAX_AGE = env.float('CLICKHOUSE_BUFFER_MAX_AGE', default=1.0)
+# HTTP body compression: none, lz4, zstd, gzip or br. lz4 is cheap on CPU,
+# zstd sends fewer bytes of the JSON event_context; see benchmarks/insert_compression.py
+CLICKHOUSE_INSERT_COMPRESSION = env('CLICKHOUSE_INSERT_COMPRESSION', default='lz4')
+CLICKHOUSE_QUERY_COMPRESSION = env('CLICKHOUSE_QUERY_COMPRESSION', default='lz4')
+# versioned schema changes applied by `manage.py migrate_clickhouse`
+CLICKHOUSE_MIGRATIONS_DIR = env(
+    'CLICKHOUSE_MIGRATIONS_DIR', default=str(BASE_DIR.parent / 'docker' / 'clickhouse' / 'migrations'),
+)
+# event_log read API: rows per response and the per-process result cache
+EVENT_LOG_QUERY_DEFAULT_LIMIT = env.int('EVENT_LOG_QUERY_DEFAULT_LIMIT', default=1000)
+EVENT_LOG_QUERY_MAX_LIMIT = env.int('EVENT_LOG_QUERY_MAX_LIMIT', default=10000)
+EVENT_LOG_QUERY_CACHE_SIZE = env.int('EVENT_LOG_QUERY_CACHE_SIZE', default=256)
+EVENT_LOG_QUERY_CACHE_TTL = env.float('EVENT_LOG_QUERY_CACHE_TTL', default=30.0)
+# starting point of the adaptive drain batch size
 LOG_BATCH_SIZE = env.int("LOG_BATCH_SIZE", default=100)
+# AIMD bounds: grow by the step while batches meet the target latency, shrink by the factor when they don't
+OUTBOX_BATCH_SIZE_MIN = env.int("OUTBOX_BATCH_SIZE_MIN", default=10)
+OUTBOX_BATCH_SIZE_MAX = env.int("OUTBOX_BATCH_SIZE_MAX", default=10000)
+OUTBOX_BATCH_TARGET_SECONDS = env.float("OUTBOX_BATCH_TARGET_SECONDS", default=1.0)
+OUTBOX_BATCH_MAX_BYTES = env.int("OUTBOX_BATCH_MAX_BYTES", default=16 * 1024 * 1024)
+OUTBOX_BATCH_INCREASE_STEP = env.int("OUTBOX_BATCH_INCREASE_STEP", default=100)
+OUTBOX_BATCH_DECREASE_FACTOR = env.float("OUTBOX_BATCH_DECREASE_FACTOR", default=0.5)
+# batches queued between the stages of the pipelined drainer
+OUTBOX_PIPELINE_DEPTH = env.int("OUTBOX_PIPELINE_DEPTH", default=2)
+# rows read from the server-side cursor and inserted at a time, bounds drain memory
+OUTBOX_STREAM_CHUNK_SIZE = env.int("OUTBOX_STREAM_CHUNK_SIZE", default=1000)
+# how long a drain worker owns claimed outbox rows before they can be re-claimed
+OUTBOX_LEASE_SECONDS = env.int("OUTBOX_LEASE_SECONDS", default=300)
+# number of drain tasks fanned out per beat tick, per shard unless the shard sets "workers"
+OUTBOX_DRAIN_WORKERS = env.int("OUTBOX_DRAIN_WORKERS", default=1)
+# drain shards, see logs.sharding.OutboxShard. For example
+# {"signups": {"event_types": ["user_created"], "queue": "outbox.signups", "workers": 2},
+#  "default": {"queue": "outbox", "priority": 0}}
+OUTBOX_SHARDS = env.json("OUTBOX_SHARDS", default={"default": {}})
+# a drain run keeps pulling batches until the outbox is empty or the budget is spent
+OUTBOX_DRAIN_TIME_BUDGET = env.float("OUTBOX_DRAIN_TIME_BUDGET", default=50.0)
+# idle drain chains re-poll with doubling delays and hand over to beat past the max
+OUTBOX_IDLE_BACKOFF_MIN = env.float("OUTBOX_IDLE_BACKOFF_MIN", default=1.0)
+OUTBOX_IDLE_BACKOFF_MAX = env.float("OUTBOX_IDLE_BACKOFF_MAX", default=30.0)
+# postgres channel notified on commit of outbox inserts, see `manage.py listen_outbox`
+OUTBOX_NOTIFY_CHANNEL = env("OUTBOX_NOTIFY_CHANNEL", default="outbox_log")
+OUTBOX_NOTIFY_COALESCE_MS = env.int("OUTBOX_NOTIFY_COALESCE_MS", default=50)
+OUTBOX_NOTIFY_POLL_INTERVAL = env.float("OUTBOX_NOTIFY_POLL_INTERVAL", default=60.0)
+# processed outbox rows are purged once older than the retention period
+OUTBOX_RETENTION_HOURS = env.float("OUTBOX_RETENTION_HOURS", default=24 * 7)
+OUTBOX_PURGE_CHUNK_SIZE = env.int("OUTBOX_PURGE_CHUNK_SIZE", default=5000)
+OUTBOX_PURGE_TIME_BUDGET = env.float("OUTBOX_PURGE_TIME_BUDGET", default=300.0)
+# events rejected by ClickHouse are retried with exponential backoff
+OUTBOX_DLQ_RETRY_BASE_SECONDS = env.float("OUTBOX_DLQ_RETRY_BASE_SECONDS", default=60.0)
+OUTBOX_DLQ_RETRY_MAX_SECONDS = env.float("OUTBOX_DLQ_RETRY_MAX_SECONDS", default=6 * 3600.0)
+OUTBOX_DLQ_MAX_ATTEMPTS = env.int("OUTBOX_DLQ_MAX_ATTEMPTS", default=10)
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -132,6 +199,18 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 CELERY_BROKER = env("CELERY_BROKER", default="redis://localhost:6379/0")
 CELERY_ALWAYS_EAGER = env("CELERY_ALWAYS_EAGER", default=DEBUG)
 
+# port of the prometheus exporter started by celery workers, 0 disables it.
+# set PROMETHEUS_MULTIPROC_DIR to aggregate metrics of all worker processes.
+CELERY_METRICS_PORT = env.int("CELERY_METRICS_PORT", default=0)
+
+# shared between web, beat and worker processes
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": env("CACHE_URL", default=CELERY_BROKER),
+    },
+}
+
 LOG_FORMATTER = env("LOG_FORMATTER", default="console")
 LOG_LEVEL = env("LOG_LEVEL", default="INFO")
 LOGGING = {
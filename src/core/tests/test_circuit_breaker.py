@@ -0,0 +1,62 @@
+import pytest
+from django.core.cache import cache
+from pytest_django.fixtures import SettingsWrapper
+
+from core import circuit_breaker
+from core.circuit_breaker import CircuitBreaker
+
+
+@pytest.fixture(autouse=True)
+def f_cache(settings: SettingsWrapper) -> None:
+    settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    cache.clear()
+
+
+@pytest.fixture
+def f_clock(monkeypatch: pytest.MonkeyPatch) -> dict[str, float]:
+    clock = {'now': 1000.0}
+    monkeypatch.setattr(circuit_breaker.time, 'time', lambda: clock['now'])
+    return clock
+
+
+@pytest.fixture
+def f_breaker() -> CircuitBreaker:
+    return CircuitBreaker('test', failure_threshold=2, recovery_timeout=30, ramp_up_seconds=100)
+
+
+@pytest.mark.usefixtures('f_clock')
+def test_breaker_opens_after_consecutive_failures(f_breaker: CircuitBreaker) -> None:
+    f_breaker.record_failure()
+    assert f_breaker.allow()
+    f_breaker.record_failure()
+    assert f_breaker.state == CircuitBreaker.OPEN
+    assert not f_breaker.allow()
+    assert not f_breaker.allow()
+    assert f_breaker.stats()['rejections'] == 2
+
+
+def test_half_open_breaker_lets_one_probe_through(f_breaker: CircuitBreaker, f_clock: dict[str, float]) -> None:
+    f_breaker.record_failure()
+    f_breaker.record_failure()
+    f_clock['now'] += 30
+    assert f_breaker.state == CircuitBreaker.HALF_OPEN
+    assert f_breaker.allow()
+    assert not f_breaker.allow()
+
+    f_breaker.record_failure()
+    assert f_breaker.state == CircuitBreaker.OPEN
+
+
+def test_recovered_breaker_ramps_load_back_up(f_breaker: CircuitBreaker, f_clock: dict[str, float]) -> None:
+    f_breaker.record_failure()
+    f_breaker.record_failure()
+    f_clock['now'] += 30
+    assert f_breaker.allow()
+    f_breaker.record_success()
+
+    assert f_breaker.state == CircuitBreaker.CLOSED
+    assert f_breaker.scale(1000) == 100
+    f_clock['now'] += 50
+    assert f_breaker.scale(1000) == 500
+    f_clock['now'] += 50
+    assert f_breaker.scale(1000) == 1000
@@ -0,0 +1,140 @@
+import datetime as dt
+from pathlib import Path
+from unittest import mock
+
+import pytest
+from pytest_django.fixtures import SettingsWrapper
+
+from core.clickhouse_migrations import load_migrations, sync_projected_columns, sync_ttl
+
+
+def test_migrations_are_loaded_in_version_order(tmp_path: Path) -> None:
+    (tmp_path / "0002_second.sql").write_text("SELECT 2")
+    (tmp_path / "0001_first.sql").write_text(
+        "-- a comment; with a semicolon\nCREATE TABLE a (x UInt8) ENGINE = Memory;\n\nSELECT 1;\n",
+    )
+    (tmp_path / "README.md").write_text("not a migration")
+
+    first, second = load_migrations(tmp_path)
+
+    assert (first.version, first.name, second.version) == (1, "first", 2)
+    assert first.statements() == ["CREATE TABLE a (x UInt8) ENGINE = Memory", "SELECT 1"]
+    assert second.statements() == ["SELECT 2"]
+
+
+def test_duplicate_versions_are_rejected(tmp_path: Path) -> None:
+    (tmp_path / "0001_a.sql").write_text("SELECT 1")
+    (tmp_path / "1_b.sql").write_text("SELECT 1")
+    with pytest.raises(ValueError, match="duplicate"):
+        load_migrations(tmp_path)
+
+
+def test_shipped_migrations_parse() -> None:
+    assert all(migration.statements() for migration in load_migrations())
+
+
+def test_table_name_is_substituted(tmp_path: Path, settings: SettingsWrapper) -> None:
+    settings.CLICKHOUSE_EVENT_LOG_TABLE_NAME = "event_log_v2"
+    (tmp_path / "0001_codec.sql").write_text("ALTER TABLE $event_log MODIFY COLUMN `x` String CODEC(ZSTD(3));")
+
+    migration, = load_migrations(tmp_path)
+
+    assert migration.statements() == ["ALTER TABLE event_log_v2 MODIFY COLUMN `x` String CODEC(ZSTD(3))"]
+
+
+def test_rollups_and_backfill_split_on_the_applied_at_time() -> None:
+    rollups = next(migration for migration in load_migrations() if migration.name == "event_counts_rollups")
+
+    applied_at = dt.datetime(2024, 1, 1, 14, 30, tzinfo=dt.timezone(dt.timedelta(hours=2)))
+    statements = rollups.statements(applied_at=applied_at)
+
+    views = [statement for statement in statements if statement.startswith("CREATE MATERIALIZED VIEW")]
+    backfills = [statement for statement in statements if statement.startswith("INSERT INTO")]
+    assert len(views) == len(backfills) == 3
+    assert all("WHERE event_date_time >= toDateTime64('2024-01-01 12:30:00', 6, 'UTC')" in view for view in views)
+    assert all(
+        "WHERE event_date_time < toDateTime64('2024-01-01 12:30:00', 6, 'UTC')" in backfill for backfill in backfills
+    )
+
+
+def test_event_id_is_added_to_an_existing_event_log() -> None:
+    migration = next(migration for migration in load_migrations() if migration.name == "event_log_event_id")
+
+    assert migration.statements() == [
+        "ALTER TABLE event_log ADD COLUMN IF NOT EXISTS `event_id` UUID",
+        "ALTER TABLE event_log MODIFY SETTING non_replicated_deduplication_window = 1000",
+    ]
+
+
+def tables_client(engines: dict[str, str]) -> mock.Mock:
+    """A client mock whose system.tables lookups return `engines` by table name."""
+    client = mock.Mock()
+    client.select.side_effect = lambda _sql, parameters: [(engines[parameters["table"]],)]
+    return client
+
+
+def test_ttl_is_set_without_rewriting_parts(settings: SettingsWrapper) -> None:
+    settings.CLICKHOUSE_EVENT_LOG_TTL_DAYS = 90
+    client = tables_client(dict.fromkeys(
+        ["event_log", "event_counts_1m", "event_counts_1h", "event_counts_1d"],
+        "ReplacingMergeTree PARTITION BY toYYYYMM(event_date_time) SETTINGS index_granularity = 8192",
+    ))
+
+    assert sync_ttl(client) == "toDateTime(event_date_time) + toIntervalDay(90)"
+    statements = [call.args[0] for call in client.command.call_args_list]
+    assert statements == [
+        "ALTER TABLE event_log MODIFY SETTING ttl_only_drop_parts = 1",
+        "ALTER TABLE event_log MODIFY TTL toDateTime(event_date_time) + toIntervalDay(90)",
+        "ALTER TABLE event_counts_1m MODIFY TTL bucket + toIntervalDay(90)",
+        "ALTER TABLE event_counts_1h MODIFY TTL bucket + toIntervalDay(90)",
+        "ALTER TABLE event_counts_1d MODIFY TTL bucket + toIntervalDay(90)",
+    ]
+    assert client.command.call_args.kwargs["settings"]["materialize_ttl_after_modify"] == 0
+
+
+def test_unchanged_ttl_is_left_alone(settings: SettingsWrapper) -> None:
+    settings.CLICKHOUSE_EVENT_LOG_TTL_DAYS = 90
+    client = tables_client({
+        "event_log": "ReplacingMergeTree ORDER BY (event_date_time) "
+                     "TTL toDateTime(event_date_time) + toIntervalDay(90) SETTINGS index_granularity = 8192",
+        "event_counts_1m": "SummingMergeTree(events) TTL bucket + toIntervalDay(90)",
+        "event_counts_1h": "SummingMergeTree(events) TTL bucket + toIntervalDay(90)",
+        "event_counts_1d": "SummingMergeTree(events) TTL bucket + toIntervalDay(90) SETTINGS index_granularity = 8192",
+    })
+
+    sync_ttl(client)
+
+    client.command.assert_not_called()
+
+
+def test_ttl_is_removed_when_disabled(settings: SettingsWrapper) -> None:
+    settings.CLICKHOUSE_EVENT_LOG_TTL_DAYS = 0
+    client = tables_client({
+        "event_log": "ReplacingMergeTree TTL toDateTime(event_date_time) + toIntervalDay(30) "
+                     "SETTINGS ttl_only_drop_parts = 1",
+        "event_counts_1m": "SummingMergeTree(events) TTL bucket + toIntervalDay(30)",
+        "event_counts_1h": "SummingMergeTree(events)",
+        "event_counts_1d": "SummingMergeTree(events)",
+    })
+
+    sync_ttl(client)
+
+    assert [call.args[0] for call in client.command.call_args_list] == [
+        "ALTER TABLE event_log REMOVE TTL",
+        "ALTER TABLE event_log RESET SETTING ttl_only_drop_parts",
+        "ALTER TABLE event_counts_1m REMOVE TTL",
+    ]
+
+
+def test_missing_projected_columns_are_added() -> None:
+    client = mock.Mock()
+    client.select.side_effect = [[("event_type",), ("event_context",)], []]
+
+    added = sync_projected_columns(client)
+
+    assert [projection.column for projection in added] == ["context_email"]
+    statements = [call.args[0] for call in client.command.call_args_list]
+    assert "ADD COLUMN IF NOT EXISTS `context_email` String " \
+           "DEFAULT JSONExtractString(event_context, 'email')" in statements[0]
+    assert "MATERIALIZE COLUMN `context_email`" in statements[1]
+    assert "TYPE bloom_filter" in statements[2]
@@ -0,0 +1,245 @@
+import datetime as dt
+import threading
+import uuid
+from collections.abc import Iterator
+from unittest import mock
+
+import pytest
+import pytz
+from clickhouse_connect.datatypes.registry import get_from_name
+from clickhouse_connect.driver.exceptions import OperationalError
+from clickhouse_connect.driver.httpclient import HttpClient
+from clickhouse_connect.driver.insert import InsertContext
+from clickhouse_connect.driver.models import SettingDef
+from django.core.exceptions import ImproperlyConfigured
+from pytest_django.fixtures import SettingsWrapper
+
+from core import event_log_client
+from core.event_log_client import (
+    EVENT_LOG_COLUMNS,
+    ClickHouseClientPool,
+    EventLogBuffer,
+    EventLogClient,
+    WireMeteredTransform,
+    transport_compression,
+)
+from core.serialization import json_dumps
+
+COLUMN_TYPES = ('String', 'DateTime64(6)', 'String', 'String', 'Int32', 'UUID')
+
+
+def _columns(rows: int) -> list[list]:
+    return [
+        ['user_created'] * rows,
+        [dt.datetime(2024, 1, 1, tzinfo=dt.UTC)] * rows,
+        ['Local'] * rows,
+        [json_dumps({'email': f'user_{i}@test.com', 'first_name': 'Test'}) for i in range(rows)],
+        [1] * rows,
+        [uuid.uuid4() for _ in range(rows)],
+    ]
+
+
+def _encode(compression: str | bool) -> tuple[int, int]:
+    column_types = [get_from_name(name) for name in COLUMN_TYPES]
+    transform = WireMeteredTransform()
+    context = InsertContext(
+        'event_log', EVENT_LOG_COLUMNS, column_types, data=_columns(500), column_oriented=True, compression=compression,
+    )
+    body = b''.join(transform.build_insert(context))
+    return transform.sent_bytes, len(body)
+
+
+def test_sent_bytes_are_counted_after_compression() -> None:
+    plain_bytes, plain_body = _encode(transport_compression('none'))
+    lz4_bytes, lz4_body = _encode(transport_compression('lz4'))
+
+    assert (plain_bytes, lz4_bytes) == (plain_body, lz4_body)
+    assert lz4_bytes < plain_bytes
+
+
+@pytest.fixture
+def f_offline_http_client() -> Iterator[list[bytes]]:
+    """A real HttpClient whose server round trips are faked; yields the insert bodies it sent."""
+    bodies: list[bytes] = []
+
+    def init_common_settings(self: HttpClient, _apply_server_timezone: bool) -> None:
+        self.server_tz, self.apply_server_timezone = pytz.UTC, False
+        self.server_version = '24.8'
+        self.server_settings = {'insert_deduplication_token': SettingDef('insert_deduplication_token', '', 0)}
+
+    def describe(_self: HttpClient, _sql: str) -> mock.Mock:
+        return mock.Mock(named_results=lambda: [
+            {'name': name, 'type': type_name, 'default_type': '', 'default_expression': '', 'comment': '',
+             'codec_expression': '', 'ttl_expression': ''}
+            for name, type_name in zip(EVENT_LOG_COLUMNS, COLUMN_TYPES, strict=True)
+        ])
+
+    def raw_request(_self: HttpClient, data: Iterator[bytes], *_args: object, **_kwargs: object) -> mock.Mock:
+        bodies.append(b''.join(data))
+        return mock.Mock(status=200, data=b'', headers={'X-ClickHouse-Summary': '{"written_bytes": "1000"}'})
+
+    with (
+        mock.patch.object(HttpClient, '_init_common_settings', init_common_settings),
+        mock.patch.object(HttpClient, 'query', describe),
+        mock.patch.object(HttpClient, '_raw_request', raw_request),
+    ):
+        yield bodies
+
+
+def test_pooled_clients_count_the_bytes_they_send(
+    settings: SettingsWrapper, f_offline_http_client: list[bytes],
+) -> None:
+    # pins the private clickhouse_connect attribute the pool replaces to meter inserts
+    settings.CLICKHOUSE_INSERT_COMPRESSION = 'lz4'
+    pool = ClickHouseClientPool(size=1, timeout=1, health_check_interval=60)
+    client = EventLogClient(pool.acquire())
+
+    client._insert(_columns(100), ['batch'], column_names=EVENT_LOG_COLUMNS, column_oriented=True)
+
+    body, = f_offline_http_client
+    assert client.wire_bytes == len(body) > 0
+    assert client.written_bytes == 1000
+
+
+@pytest.mark.parametrize(('wait', 'wait_setting'), [(True, 1), (False, 0)])
+def test_async_insert_mode_sets_the_insert_settings(settings: SettingsWrapper, wait: bool, wait_setting: int) -> None:
+    settings.CLICKHOUSE_INSERT_MODE = 'async'
+    settings.CLICKHOUSE_ASYNC_INSERT_WAIT = wait
+    raw_client = mock.Mock()
+    raw_client.insert.return_value.written_bytes.return_value = 0
+
+    with mock.patch.object(EventLogClient, '_projections', return_value=[]):
+        EventLogClient(raw_client).insert_columns(_columns(3))
+
+    insert_settings = raw_client.insert.call_args.kwargs['settings']
+    assert len(insert_settings.pop('insert_deduplication_token')) == 64
+    assert insert_settings == {'async_insert': 1, 'async_insert_deduplicate': 1, 'wait_for_async_insert': wait_setting}
+
+
+def test_sync_insert_mode_only_sets_the_deduplication_token(settings: SettingsWrapper) -> None:
+    settings.CLICKHOUSE_INSERT_MODE = 'sync'
+    raw_client = mock.Mock()
+    raw_client.insert.return_value.written_bytes.return_value = 0
+
+    with mock.patch.object(EventLogClient, '_projections', return_value=[]):
+        EventLogClient(raw_client).insert_columns(_columns(3))
+
+    assert list(raw_client.insert.call_args.kwargs['settings']) == ['insert_deduplication_token']
+
+
+def test_buffer_flushes_once_max_rows_are_pending() -> None:
+    on_flush = mock.Mock()
+    buffer = EventLogBuffer(max_rows=4, max_age=60, on_flush=on_flush)
+
+    assert not buffer.add(_columns(2), [1, 2])
+    on_flush.assert_not_called()
+    assert buffer.add(_columns(2), [3, 4])
+
+    columns, keys = on_flush.call_args.args
+    assert (len(columns[0]), keys) == (4, [1, 2, 3, 4])
+    assert (len(buffer), buffer.keys) == (0, [])
+
+
+def test_buffer_flushes_once_the_oldest_row_is_max_age_old(monkeypatch: pytest.MonkeyPatch) -> None:
+    clock = {'now': 100.0}
+    monkeypatch.setattr(event_log_client.time, 'monotonic', lambda: clock['now'])
+    on_flush = mock.Mock()
+    buffer = EventLogBuffer(max_rows=100, max_age=5, on_flush=on_flush)
+
+    assert not buffer.add(_columns(1), [1])
+    clock['now'] += 4
+    assert not buffer.add(_columns(1), [2])
+    assert not buffer.is_due()
+    clock['now'] += 1
+
+    assert buffer.is_due()
+    assert buffer.add(_columns(1), [3])
+    assert on_flush.call_args.args[1] == [1, 2, 3]
+
+
+def test_failed_flush_keeps_the_rows_and_keys() -> None:
+    buffer = EventLogBuffer(max_rows=2, max_age=60, on_flush=mock.Mock(side_effect=OperationalError('down')))
+
+    with pytest.raises(OperationalError):
+        buffer.add(_columns(2), [1, 2])
+
+    assert (len(buffer), buffer.keys) == (2, [1, 2])
+
+
+@pytest.fixture
+def f_get_client() -> Iterator[mock.Mock]:
+    with mock.patch('core.event_log_client.clickhouse_connect.get_client', side_effect=lambda **_: mock.Mock()) as get:
+        yield get
+
+
+def test_released_client_is_reused(f_get_client: mock.Mock) -> None:
+    pool = ClickHouseClientPool(size=2, timeout=1, health_check_interval=60)
+    client = pool.acquire()
+    pool.release(client)
+
+    assert pool.acquire() is client
+    assert f_get_client.call_count == 1
+    client.ping.assert_not_called()
+    assert pool.stats | {'setup_seconds': 0} == {
+        'created': 1, 'reused': 1, 'discarded': 0, 'setup_seconds': 0, 'open': 1, 'idle': 0, 'size': 2,
+    }
+
+
+def test_client_idle_past_the_health_check_interval_is_pinged(f_get_client: mock.Mock) -> None:
+    pool = ClickHouseClientPool(size=1, timeout=1, health_check_interval=0)
+    client = pool.acquire()
+    client.ping.return_value = False
+    pool.release(client)
+
+    replacement = pool.acquire()
+
+    assert replacement is not client
+    client.ping.assert_called_once()
+    client.close.assert_called_once()
+    assert f_get_client.call_count == 2
+    assert (pool.stats['open'], pool.stats['discarded']) == (1, 1)
+
+
+def test_unhealthy_client_is_discarded(f_get_client: mock.Mock) -> None:
+    pool = ClickHouseClientPool(size=1, timeout=1, health_check_interval=60)
+    client = pool.acquire()
+    pool.release(client, healthy=False)
+
+    client.close.assert_called_once()
+    assert (pool.stats['open'], pool.stats['idle'], pool.stats['discarded']) == (0, 0, 1)
+    assert pool.acquire() is not client
+    assert f_get_client.call_count == 2
+
+
+def test_acquire_times_out_when_every_client_is_in_use(f_get_client: mock.Mock) -> None:
+    pool = ClickHouseClientPool(size=1, timeout=0.05, health_check_interval=60)
+    pool.acquire()
+
+    with pytest.raises(OperationalError, match='timed out'):
+        pool.acquire()
+    assert f_get_client.call_count == 1
+
+
+@pytest.mark.parametrize('healthy', [True, False])
+def test_waiting_acquire_is_woken_when_a_client_is_freed(f_get_client: mock.Mock, healthy: bool) -> None:
+    pool = ClickHouseClientPool(size=1, timeout=5, health_check_interval=60)
+    client = pool.acquire()
+    acquired = []
+    waiter = threading.Thread(target=lambda: acquired.append(pool.acquire()))
+    waiter.start()
+    waiter.join(0.05)
+    assert waiter.is_alive()
+
+    pool.release(client, healthy=healthy)
+    waiter.join(1)
+
+    assert not waiter.is_alive()
+    assert (acquired[0] is client) == healthy
+    assert f_get_client.call_count == (1 if healthy else 2)
+    assert pool.stats['open'] == 1
+
+
+def test_unknown_compression_is_rejected() -> None:
+    assert transport_compression('zstd') == 'zstd'
+    with pytest.raises(ImproperlyConfigured, match='snappy'):
+        transport_compression('snappy')
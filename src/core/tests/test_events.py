@@ -0,0 +1,87 @@
+from unittest import mock
+
+import pytest
+
+from core import event_log_client, events
+from core.base_model import Model
+from core.event_log_client import EVENT_LOG_COLUMNS, EventLogClient
+from core.events import get_event, projected_columns, register_event
+from users.use_cases import UserCreated
+
+
+@pytest.fixture(autouse=True)
+def f_registry(monkeypatch: pytest.MonkeyPatch) -> None:
+    # events registered by a test must not leak into the registry of the next ones
+    monkeypatch.setattr(events, '_registry', dict(events._registry))
+
+
+def test_registered_event_serializes_to_event_context() -> None:
+    registered = get_event(UserCreated)
+    event = UserCreated(email='test@email.com', first_name='Test', last_name='Testovich')
+    assert registered.name == 'user_created'
+    assert registered.version == 1
+    assert registered.serialize(event) == {
+        'email': 'test@email.com',
+        'first_name': 'Test',
+        'last_name': 'Testovich',
+    }
+
+
+def test_event_name_defaults_to_snake_cased_class_name() -> None:
+    @register_event(version=2)
+    class PasswordChanged(Model):
+        email: str
+
+    assert get_event(PasswordChanged).name == 'password_changed'
+    assert EventLogClient(client=None)._to_snake_case('PasswordChanged') == 'password_changed'
+
+
+def test_event_name_and_version_must_be_unique() -> None:
+    with pytest.raises(ValueError, match='already registered'):
+        @register_event('user_created')
+        class UserCreatedAgain(Model):
+            email: str
+
+
+def test_unregistered_event_can_not_be_emitted() -> None:
+    class NotAnEvent(Model):
+        email: str
+
+    with pytest.raises(LookupError):
+        get_event(NotAnEvent)
+
+
+def test_projected_fields_get_typed_columns() -> None:
+    projection = projected_columns()['context_email']
+    assert (projection.clickhouse_type, projection.indexed) == ('String', True)
+    assert projection.default_expression == "JSONExtractString(event_context, 'email')"
+    assert projection.extract({'email': 'test@email.com'}) == 'test@email.com'
+    assert projection.extract({'email': 42}) == ''
+    assert projection.extract({}) == ''
+
+
+def test_projected_fields_must_exist_and_have_a_column_type() -> None:
+    with pytest.raises(ValueError, match='no field'):
+        @register_event(projected=('phone',))
+        class PhoneAdded(Model):
+            email: str
+
+    with pytest.raises(ValueError, match='can not project'):
+        @register_event(projected=('tags',))
+        class TagsAdded(Model):
+            tags: list[str]
+
+
+def test_client_fills_projected_columns_present_in_the_table(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(event_log_client, '_table_columns', {})
+    clickhouse = mock.Mock()
+    clickhouse.query.return_value.result_rows = [(column,) for column in EVENT_LOG_COLUMNS + ['context_email']]
+    clickhouse.insert.return_value.written_bytes.return_value = 0
+    client = EventLogClient(client=clickhouse)
+    columns = [['user_created'], [None], ['Local'], [{'email': 'test@email.com'}], [1], ['id']]
+
+    client.insert_columns(columns)
+
+    insert = clickhouse.insert.call_args.kwargs
+    assert insert['column_names'] == EVENT_LOG_COLUMNS + ['context_email']
+    assert insert['data'][-1] == ['test@email.com']
@@ -0,0 +1,29 @@
+import pytest
+
+from core import use_case
+from core.use_case import UseCase
+from users.use_cases import UserCreated
+
+
+class EmitOnly(UseCase):
+    pass
+
+
+def test_events_are_handed_to_the_event_writer(monkeypatch: pytest.MonkeyPatch) -> None:
+    written = []
+    monkeypatch.setattr(use_case, '_event_writer', written.extend)
+    case = EmitOnly()
+
+    case._emit(UserCreated(email='test@email.com', first_name='Test', last_name='Testovich'))
+    case._flush_events()
+
+    emitted, = written
+    assert emitted.registered.name == 'user_created'
+    assert emitted.event.email == 'test@email.com'
+    assert case._outbox_events == []
+
+
+def test_logs_app_installs_the_outbox_writer() -> None:
+    from logs.outbox import write_outbox_events
+
+    assert use_case._event_writer is write_outbox_events
@@ -17,6 +17,11 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path
 
+from logs.views import event_counts, events, metrics
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics, name='metrics'),
+    path('events', events, name='events'),
+    path('events/counts', event_counts, name='event_counts'),
 ]
@@ -1,9 +1,31 @@
-from typing import Any, Protocol
+from collections.abc import Callable
+from datetime import datetime
+from typing import Any, NamedTuple, Protocol
 
 import structlog
+from django.core.exceptions import ImproperlyConfigured
 from django.db import transaction
+from django.utils import timezone
 
 from core.base_model import Model
+from core.events import RegisteredEvent, get_event
+
+
+class EmittedEvent(NamedTuple):
+    registered: RegisteredEvent
+    event: Model
+    emitted_at: datetime
+
+
+EventWriter = Callable[[list[EmittedEvent]], None]
+
+# persists emitted events inside the use case transaction, installed by the logs app
+_event_writer: EventWriter | None = None
+
+
+def set_event_writer(writer: EventWriter | None) -> None:
+    global _event_writer
+    _event_writer = writer
 
 
 class UseCaseRequest(Model):
@@ -16,11 +38,18 @@ class UseCaseResponse(Model):
 
 
 class UseCase(Protocol):
+    def __init__(self) -> None:
+        self._outbox_events: list[EmittedEvent] = []
+
     def execute(self, request: UseCaseRequest) -> UseCaseResponse:
         with structlog.contextvars.bound_contextvars(
             **self._get_context_vars(request),
-        ):
-            return self._execute(request)
+        ), transaction.atomic():
+            self._outbox_events = []
+            response = self._execute(request)
+            # still inside the transaction, so events commit or roll back with the use case
+            self._flush_events()
+            return response
 
     def _get_context_vars(self, request: UseCaseRequest) -> dict[str, Any]:  # noqa: ARG002
         """
@@ -35,3 +64,15 @@ class UseCase(Protocol):
     @transaction.atomic()
     def _execute(self, request: UseCaseRequest) -> UseCaseResponse:
         raise NotImplementedError()
+
+    def _emit(self, event: Model) -> None:
+        """Buffer a registered event; buffered events are written together before commit."""
+        self._outbox_events.append(EmittedEvent(get_event(type(event)), event, timezone.now()))
+
+    def _flush_events(self) -> None:
+        if not self._outbox_events:
+            return
+        if _event_writer is None:
+            raise ImproperlyConfigured('no event writer is set, is the logs app installed?')
+        _event_writer(self._outbox_events)
+        self._outbox_events = []
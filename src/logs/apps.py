@@ -0,0 +1,16 @@
+from django.apps import AppConfig
+
+
+class LogsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'logs'
+
+    def ready(self) -> None:
+        from core.events import autodiscover_events
+        from core.use_case import set_event_writer
+        from logs.outbox import write_outbox_events
+
+        # events emitted by use cases go to the outbox
+        set_event_writer(write_outbox_events)
+        # the event registry decides which event_log columns the client fills
+        autodiscover_events()
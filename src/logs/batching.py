@@ -0,0 +1,73 @@
+import structlog
+from django.conf import settings
+from django.core.cache import cache
+
+logger = structlog.get_logger(__name__)
+
+
+class AdaptiveBatchSize:
+    """
+    AIMD controller for the drain batch size, shared by all workers through
+    the cache. Every full batch that finishes within `target_seconds` and
+    `max_bytes` grows the size by `increase_step`; a slower or heavier batch
+    multiplies it by `decrease_factor`. Partial batches say nothing about
+    capacity and leave the size alone.
+    """
+
+    CACHE_KEY = "outbox:batch_size"
+
+    def __init__(
+        self,
+        initial: int,
+        min_size: int,
+        max_size: int,
+        target_seconds: float,
+        max_bytes: int,
+        increase_step: int,
+        decrease_factor: float,
+    ) -> None:
+        self._initial = initial
+        self._min_size = min_size
+        self._max_size = max_size
+        self._target_seconds = target_seconds
+        self._max_bytes = max_bytes
+        self._increase_step = increase_step
+        self._decrease_factor = decrease_factor
+
+    @property
+    def current(self) -> int:
+        return cache.get(self.CACHE_KEY) or self._clamp(self._initial)
+
+    def observe(self, batch_size: int, rows: int, seconds: float, payload_bytes: int) -> int:
+        current = self.current
+        if seconds > self._target_seconds or payload_bytes > self._max_bytes:
+            new_size = self._clamp(int(current * self._decrease_factor))
+        elif rows >= batch_size:
+            new_size = self._clamp(current + self._increase_step)
+        else:
+            return current
+        if new_size != current:
+            cache.set(self.CACHE_KEY, new_size, timeout=None)
+            logger.info(
+                "Outbox batch size changed",
+                batch_size=new_size,
+                previous_batch_size=current,
+                seconds=round(seconds, 4),
+                payload_bytes=payload_bytes,
+            )
+        return new_size
+
+    def _clamp(self, size: int) -> int:
+        return min(max(size, self._min_size), self._max_size)
+
+
+def get_batch_size_controller() -> AdaptiveBatchSize:
+    return AdaptiveBatchSize(
+        initial=settings.LOG_BATCH_SIZE,
+        min_size=settings.OUTBOX_BATCH_SIZE_MIN,
+        max_size=settings.OUTBOX_BATCH_SIZE_MAX,
+        target_seconds=settings.OUTBOX_BATCH_TARGET_SECONDS,
+        max_bytes=settings.OUTBOX_BATCH_MAX_BYTES,
+        increase_step=settings.OUTBOX_BATCH_INCREASE_STEP,
+        decrease_factor=settings.OUTBOX_BATCH_DECREASE_FACTOR,
+    )
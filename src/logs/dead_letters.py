@@ -0,0 +1,169 @@
+import re
+from datetime import datetime, timedelta
+
+import structlog
+from clickhouse_connect.driver.exceptions import DatabaseError, DataError, OperationalError
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from core.circuit_breaker import get_clickhouse_breaker
+from core.event_log_client import EVENT_LOG_COLUMNS, EventLogClient
+from logs.models import DeadLetterLog, OutboxLog
+
+logger = structlog.get_logger(__name__)
+
+# ClickHouse errors caused by the rows themselves; any other server error (TOO_MANY_PARTS,
+# MEMORY_LIMIT_EXCEEDED, timeouts) would fail every half of the batch too
+DATA_ERROR_PREFIXES = ('CANNOT_PARSE_',)
+DATA_ERRORS = frozenset({
+    'TYPE_MISMATCH',
+    'TOO_LARGE_STRING_SIZE',
+    'CANNOT_CONVERT_TYPE',
+    'INCORRECT_DATA',
+    'VALUE_IS_OUT_OF_RANGE_OF_DATA_TYPE',
+    'CANNOT_INSERT_NULL_IN_ORDINARY_COLUMN',
+})
+# the server appends the error name to its message: "Code: 27. DB::Exception: ... (CANNOT_PARSE_INPUT_ASSERTION_FAILED)"
+ERROR_NAME = re.compile(r'\(([A-Z][A-Z0-9_]+)\)')
+
+
+def is_poison(error: Exception) -> bool:
+    """Whether an insert failed because of the rows it carried, rather than the server or the network."""
+    if isinstance(error, OperationalError):
+        return False
+    # raised by the client while serializing a value
+    if isinstance(error, DataError | TypeError | ValueError):
+        return True
+    if isinstance(error, DatabaseError):
+        return any(
+            name in DATA_ERRORS or name.startswith(DATA_ERROR_PREFIXES) for name in ERROR_NAME.findall(str(error))
+        )
+    return False
+
+
+def insert_isolating(client: EventLogClient, columns: list[list], keys: list) -> dict:
+    """
+    Insert a column batch, bisecting it on data errors until the offending
+    rows are isolated. Returns {key: error} for rows that could not be
+    inserted; every other row is delivered.
+    """
+    try:
+        client.insert_columns(columns)
+        return {}
+    except (DatabaseError, TypeError, ValueError) as e:
+        if not is_poison(e):
+            raise
+        if len(keys) == 1:
+            return {keys[0]: str(e)}
+        middle = len(keys) // 2
+        failed = insert_isolating(client, [column[:middle] for column in columns], keys[:middle])
+        failed.update(insert_isolating(client, [column[middle:] for column in columns], keys[middle:]))
+        return failed
+
+
+def next_retry_at(attempts: int) -> datetime | None:
+    if attempts >= settings.OUTBOX_DLQ_MAX_ATTEMPTS:
+        return None
+    delay = min(
+        settings.OUTBOX_DLQ_RETRY_BASE_SECONDS * 2 ** (attempts - 1),
+        settings.OUTBOX_DLQ_RETRY_MAX_SECONDS,
+    )
+    return timezone.now() + timedelta(seconds=delay)
+
+
+def dead_letter_logs(errors: dict[int, str]) -> None:
+    """Copy rejected outbox rows to the dead-letter table; the caller marks them processed."""
+    logs = OutboxLog.objects.filter(id__in=errors).values("id", *EVENT_LOG_COLUMNS)
+    DeadLetterLog.objects.bulk_create(
+        [
+            DeadLetterLog(
+                **{field: value for field, value in log.items() if field != "id"},
+                error=errors[log["id"]],
+                next_retry_at=next_retry_at(attempts=1),
+            )
+            for log in logs
+        ],
+        ignore_conflicts=True,
+    )
+    logger.warning("Moved outbox logs to the dead-letter queue", count=len(errors))
+
+
+def retry_dead_letters(dead_letters: QuerySet | None = None, batch_size: int | None = None) -> int:
+    """
+    Re-send dead letters that are due (or the given ones, regardless of
+    schedule). Delivered entries are deleted, the rest get another attempt
+    scheduled. Returns the number of delivered events.
+
+    Each batch is claimed in a short transaction that pushes its
+    `next_retry_at` out by OUTBOX_LEASE_SECONDS, so no row lock is held
+    while ClickHouse is waited on and concurrent retries skip the batch.
+    """
+    batch_size = batch_size or settings.LOG_BATCH_SIZE
+    breaker = get_clickhouse_breaker()
+    if not breaker.allow():
+        return 0
+    if dead_letters is None:
+        dead_letters = DeadLetterLog.objects.filter(next_retry_at__lte=timezone.now())
+    delivered = 0
+    last_id = 0
+    while batch := _claim_dead_letters(dead_letters, last_id, batch_size):
+        last_id = batch[-1][0]
+        delivered += _retry_batch(batch)
+    return delivered
+
+
+def _retry_batch(batch: list[tuple]) -> int:
+    """Send a claimed batch: delete what went through, reschedule the rest. Returns the number delivered."""
+    breaker = get_clickhouse_breaker()
+    ids, leased_from, *columns = (list(column) for column in zip(*batch, strict=True))
+    try:
+        with EventLogClient.init() as client:
+            failed = insert_isolating(client, columns, ids)
+    except DatabaseError:
+        breaker.record_failure()
+        _release_dead_letters(dict(zip(ids, leased_from, strict=True)))
+        raise
+    breaker.record_success()
+    with db_transaction.atomic():
+        DeadLetterLog.objects.filter(id__in=set(ids) - set(failed)).delete()
+        _reschedule(failed)
+    return len(ids) - len(failed)
+
+
+def _claim_dead_letters(dead_letters: QuerySet, after_id: int, batch_size: int) -> list[tuple]:
+    """
+    The next batch after `after_id` as (id, next_retry_at, *EVENT_LOG_COLUMNS)
+    rows, leased by moving next_retry_at; the rows keep the schedule it had.
+    """
+    with db_transaction.atomic():
+        rows = list(
+            dead_letters.filter(id__gt=after_id)
+            .select_for_update(skip_locked=True)
+            .order_by("id")
+            .values_list("id", "next_retry_at", *EVENT_LOG_COLUMNS)[:batch_size],
+        )
+        if rows:
+            DeadLetterLog.objects.filter(id__in=[row[0] for row in rows]).update(
+                next_retry_at=timezone.now() + timedelta(seconds=settings.OUTBOX_LEASE_SECONDS),
+            )
+    return rows
+
+
+def _release_dead_letters(leased_from: dict) -> None:
+    """Put the schedule of a batch that could not be sent back as it was before the claim."""
+    schedules: dict = {}
+    for dead_letter_id, retry_at in leased_from.items():
+        schedules.setdefault(retry_at, []).append(dead_letter_id)
+    with db_transaction.atomic():
+        for retry_at, ids in schedules.items():
+            DeadLetterLog.objects.filter(id__in=ids).update(next_retry_at=retry_at)
+
+
+def _reschedule(errors: dict[int, str]) -> None:
+    for dead_letter in DeadLetterLog.objects.filter(id__in=errors):
+        dead_letter.attempts += 1
+        dead_letter.error = errors[dead_letter.id]
+        dead_letter.next_retry_at = next_retry_at(dead_letter.attempts)
+        dead_letter.save(update_fields=["attempts", "error", "next_retry_at"])
@@ -0,0 +1,48 @@
+import asyncio
+import time
+
+import structlog
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandParser
+
+from logs.pipeline import drain_pipelined
+from logs.sharding import get_shard
+
+logger = structlog.get_logger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Drain the outbox with fetching, ClickHouse inserts and marking rows "
+        "processed pipelined, optionally in a loop."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--batch-size", type=int, help="Fixed batch size, adaptive when omitted.")
+        parser.add_argument("--shard", help="Only drain this shard of OUTBOX_SHARDS.")
+        parser.add_argument("--depth", type=int, default=settings.OUTBOX_PIPELINE_DEPTH)
+        parser.add_argument("--time-budget", type=float, default=settings.OUTBOX_DRAIN_TIME_BUDGET)
+        parser.add_argument("--loop", action="store_true", help="Keep draining instead of exiting when empty.")
+        parser.add_argument("--poll-interval", type=float, default=settings.OUTBOX_NOTIFY_POLL_INTERVAL)
+
+    def handle(self, *_args: str, **options: object) -> None:
+        shard = get_shard(options["shard"]) if options["shard"] else None
+        while True:
+            result = asyncio.run(
+                drain_pipelined(
+                    batch_size=options["batch_size"],
+                    depth=options["depth"],
+                    time_budget=options["time_budget"],
+                    shard=shard,
+                ),
+            )
+            logger.info(
+                "Drained outbox",
+                processed_count=result.processed,
+                batches=result.batches,
+                backlog=result.backlog,
+            )
+            if not options["loop"]:
+                return
+            if not result.backlog:
+                time.sleep(options["poll_interval"])
@@ -0,0 +1,57 @@
+import time
+
+import psycopg2
+import structlog
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import close_old_connections
+
+from logs.notifications import listen_outbox, wait_for_outbox
+from logs.services import drain_logs
+from logs.sharding import OutboxShard, get_shard
+
+logger = structlog.get_logger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Drain the outbox as soon as new events are committed, "
+        "falling back to polling when no notifications arrive."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--batch-size", type=int, help="Fixed batch size, adaptive when omitted.")
+        parser.add_argument("--shard", help="Only drain this shard of OUTBOX_SHARDS.")
+        parser.add_argument("--poll-interval", type=float, default=settings.OUTBOX_NOTIFY_POLL_INTERVAL)
+        parser.add_argument("--coalesce-ms", type=int, default=settings.OUTBOX_NOTIFY_COALESCE_MS)
+
+    def handle(self, *_args: str, **options: object) -> None:
+        shard = get_shard(options["shard"]) if options["shard"] else None
+        conn = None
+        while True:
+            try:
+                conn = conn or listen_outbox()
+                received = wait_for_outbox(conn, options["poll_interval"], options["coalesce_ms"] / 1000)
+            except psycopg2.Error as e:
+                logger.error("Outbox listener connection lost", error=str(e))
+                if conn is not None:
+                    conn.close()
+                conn = None
+                time.sleep(1)
+                continue
+            # like a request would: drop a connection broken by a restart or idle timeout
+            close_old_connections()
+            self._drain(options["batch_size"], shard, received)
+
+    def _drain(self, batch_size: int | None, shard: OutboxShard | None, received: int) -> None:
+        try:
+            result = drain_logs(batch_size=batch_size, shard=shard)
+        except Exception as e:
+            logger.error("Failed to drain outbox", error=str(e))
+            return
+        logger.info(
+            "Drained outbox",
+            trigger="notify" if received else "poll",
+            notifications=received,
+            processed_count=result.processed,
+        )
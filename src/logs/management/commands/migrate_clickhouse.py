@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandParser
+
+from core.clickhouse_migrations import applied_versions, load_migrations, migrate, pending_mutations
+from core.event_log_client import EventLogClient
+
+
+class Command(BaseCommand):
+    help = "Apply pending ClickHouse migrations from CLICKHOUSE_MIGRATIONS_DIR."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--list", action="store_true",
+            help="Show migrations and whether they are applied, and the mutations still running.",
+        )
+
+    def handle(self, *_args: str, **options: object) -> None:
+        if options["list"]:
+            self._list()
+            return
+        migrations = migrate()
+        for migration in migrations:
+            self.stdout.write(f"Applied {migration.version:04d} {migration.name}")
+        if not migrations:
+            self.stdout.write("No ClickHouse migrations to apply")
+
+    def _list(self) -> None:
+        with EventLogClient.init() as client:
+            applied = applied_versions(client)
+            mutations = pending_mutations(client)
+        for migration in load_migrations():
+            mark = "X" if migration.version in applied else " "
+            self.stdout.write(f"[{mark}] {migration.version:04d} {migration.name}")
+        for table, mutation_id, command, parts_to_do in mutations:
+            self.stdout.write(f"Running on {table}: {mutation_id} {command} ({parts_to_do} parts to do)")
@@ -0,0 +1,46 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandParser
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from logs.dead_letters import retry_dead_letters
+from logs.models import DeadLetterLog
+
+
+class Command(BaseCommand):
+    help = "Inspect, replay or purge dead-lettered outbox events."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("action", choices=["stats", "replay", "purge"])
+        parser.add_argument("--event-type", help="Only entries of this event type.")
+        parser.add_argument("--older-than-hours", type=float, help="Only entries dead-lettered before this age.")
+        parser.add_argument("--exhausted", action="store_true", help="Only entries that ran out of retries.")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *_args: str, **options: object) -> None:
+        dead_letters = self._filter(DeadLetterLog.objects.all(), options)
+        if options["action"] == "stats":
+            self._stats(dead_letters)
+        elif options["action"] == "replay":
+            total = dead_letters.count()
+            delivered = retry_dead_letters(dead_letters, batch_size=options["batch_size"])
+            self.stdout.write(f"Replayed {delivered} of {total} dead-lettered events")
+        else:
+            deleted, _ = dead_letters.delete()
+            self.stdout.write(f"Purged {deleted} dead-lettered events")
+
+    def _filter(self, dead_letters: QuerySet, options: dict[str, object]) -> QuerySet:
+        if options["event_type"]:
+            dead_letters = dead_letters.filter(event_type=options["event_type"])
+        if options["older_than_hours"] is not None:
+            cutoff = timezone.now() - timedelta(hours=options["older_than_hours"])
+            dead_letters = dead_letters.filter(created_at__lt=cutoff)
+        if options["exhausted"]:
+            dead_letters = dead_letters.filter(next_retry_at__isnull=True)
+        return dead_letters
+
+    def _stats(self, dead_letters: QuerySet) -> None:
+        self.stdout.write(f"total: {dead_letters.count()}")
+        self.stdout.write(f"exhausted: {dead_letters.filter(next_retry_at__isnull=True).count()}")
+        self.stdout.write(f"due: {dead_letters.filter(next_retry_at__lte=timezone.now()).count()}")
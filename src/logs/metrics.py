@@ -0,0 +1,73 @@
+from collections.abc import Iterator
+
+from django.db.models import Count, Min
+from django.utils import timezone
+from prometheus_client import Counter, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, Metric
+
+from core.circuit_breaker import CircuitBreaker, get_clickhouse_breaker
+from core.metrics import SCRAPE_REGISTRY
+from logs.batching import get_batch_size_controller
+from logs.models import DeadLetterLog, OutboxLog
+
+BATCH_SIZE_BUCKETS = (1, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+BYTES_BUCKETS = tuple(1024 * 4 ** exponent for exponent in range(10))
+
+EVENTS_DELIVERED = Counter("outbox_events_delivered_total", "Outbox events inserted into ClickHouse")
+EVENTS_DEAD_LETTERED = Counter("outbox_events_dead_lettered_total", "Outbox events moved to the dead-letter queue")
+DRAIN_FAILURES = Counter("outbox_drain_failures_total", "Outbox batches that could not be delivered", ["cause"])
+BATCH_SIZE = Histogram("outbox_batch_size", "Rows per claimed outbox batch", buckets=BATCH_SIZE_BUCKETS)
+FETCH_SECONDS = Histogram("outbox_fetch_seconds", "Time to claim and read an outbox batch")
+INSERT_SECONDS = Histogram("outbox_insert_seconds", "Time to insert a batch into ClickHouse")
+INSERT_WIRE_BYTES = Histogram(
+    "outbox_insert_wire_bytes", "Compressed bytes sent to ClickHouse per inserted batch", buckets=BYTES_BUCKETS,
+)
+EVENT_LOG_QUERY_CACHE = Counter(
+    "event_log_query_cache_requests_total", "event_log read API cache lookups", ["result"],
+)
+EVENT_LOG_ROLLUP_QUERIES = Counter(
+    "event_log_rollup_queries_total", "event_log count queries by the table they are routed to", ["source"],
+)
+EVENT_LOG_QUERY_SECONDS = Histogram("event_log_query_seconds", "Time to run an event_log read query")
+
+
+class OutboxCollector:
+    """Gauges read from the database and the shared cache when metrics are scraped."""
+
+    def describe(self) -> list[Metric]:
+        # keeps registration from running the queries in `collect`
+        return []
+
+    def collect(self) -> Iterator[Metric]:
+        backlog = OutboxLog.objects.filter(processed=False).aggregate(
+            count=Count("id"), oldest=Min("event_date_time"),
+        )
+        yield GaugeMetricFamily("outbox_backlog", "Unprocessed outbox events", value=backlog["count"])
+        oldest_age = (timezone.now() - backlog["oldest"]).total_seconds() if backlog["oldest"] else 0
+        yield GaugeMetricFamily(
+            "outbox_oldest_unprocessed_age_seconds", "Age of the oldest unprocessed outbox event", value=oldest_age,
+        )
+        yield GaugeMetricFamily(
+            "outbox_dead_letters", "Events waiting in the dead-letter queue", value=DeadLetterLog.objects.count(),
+        )
+        yield GaugeMetricFamily(
+            "outbox_adaptive_batch_size",
+            "Current adaptive drain batch size",
+            value=get_batch_size_controller().current,
+        )
+        yield from self._collect_breaker(get_clickhouse_breaker())
+
+    def _collect_breaker(self, breaker: CircuitBreaker) -> Iterator[Metric]:
+        stats = breaker.stats()
+        state = GaugeMetricFamily("circuit_breaker_state", "Circuit breaker state (1 for the current one)",
+                                  labels=["circuit", "state"])
+        for name in (CircuitBreaker.CLOSED, CircuitBreaker.OPEN, CircuitBreaker.HALF_OPEN):
+            state.add_metric([breaker.name, name], int(stats["state"] == name))
+        yield state
+        rejections = CounterMetricFamily("circuit_breaker_rejections", "Calls rejected by an open circuit",
+                                         labels=["circuit"])
+        rejections.add_metric([breaker.name], stats["rejections"])
+        yield rejections
+
+
+SCRAPE_REGISTRY.register(OutboxCollector())
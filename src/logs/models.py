@@ -1,15 +1,48 @@
+import uuid
+
 from django.db import models
+from django.db.models import Q
 from django.utils.timezone import now
 
+from core.models import TimeStampedModel
+
+
 class OutboxLog(models.Model):
+    # stable id carried into event_log so redelivered events deduplicate
+    event_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
     event_type = models.CharField(max_length=255)
     event_date_time = models.DateTimeField(default=now)
     environment = models.CharField(max_length=255)
     event_context = models.JSONField()
     metadata_version = models.PositiveIntegerField(default=1)
     processed = models.BooleanField(default=False)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    # lease of the drain worker currently delivering the row
+    locked_by = models.CharField(max_length=255, null=True, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         indexes = [
-            models.Index(fields=["processed", "event_date_time"]),
+            # drain scans walk unprocessed rows only, in id order
+            models.Index(fields=["id"], condition=Q(processed=False), name="outbox_unprocessed_idx"),
+            # same walk for shards that own a set of event types
+            models.Index(
+                fields=["event_type", "id"], condition=Q(processed=False), name="outbox_unprocessed_type_idx",
+            ),
+            # retention purge scans processed rows only
+            models.Index(fields=["processed_at"], condition=Q(processed=True), name="outbox_processed_at_idx"),
         ]
+
+
+class DeadLetterLog(TimeStampedModel):
+    """An outbox event ClickHouse rejected, kept apart from the outbox and retried with backoff."""
+    event_id = models.UUIDField(unique=True, editable=False)
+    event_type = models.CharField(max_length=255)
+    event_date_time = models.DateTimeField()
+    environment = models.CharField(max_length=255)
+    event_context = models.JSONField()
+    metadata_version = models.PositiveIntegerField(default=1)
+    error = models.TextField()
+    attempts = models.PositiveIntegerField(default=1)
+    # null once the event ran out of attempts and only a manual replay will send it
+    next_retry_at = models.DateTimeField(null=True, blank=True, db_index=True)
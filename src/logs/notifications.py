@@ -0,0 +1,50 @@
+import select
+import time
+
+import psycopg2
+import structlog
+from django.conf import settings
+from django.db import connection, connections
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+logger = structlog.get_logger(__name__)
+
+
+def notify_outbox() -> None:
+    """
+    Wake outbox listeners. Postgres delivers the notification on commit and
+    folds identical ones from the same transaction, so calling this once per
+    written event is cheap.
+    """
+    if connection.vendor != "postgresql":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_notify(%s, '')", [settings.OUTBOX_NOTIFY_CHANNEL])
+
+
+def listen_outbox() -> psycopg2.extensions.connection:
+    """Open a dedicated autocommit connection subscribed to the outbox channel."""
+    conn = psycopg2.connect(**connections["default"].get_connection_params())
+    conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+    with conn.cursor() as cursor:
+        cursor.execute(f'LISTEN "{settings.OUTBOX_NOTIFY_CHANNEL}"')
+    logger.info("Listening for outbox notifications", channel=settings.OUTBOX_NOTIFY_CHANNEL)
+    return conn
+
+
+def wait_for_outbox(conn: psycopg2.extensions.connection, timeout: float, coalesce: float) -> int:
+    """
+    Block until a notification arrives or `timeout` passes, then keep
+    collecting notifications for `coalesce` seconds so a burst of inserts
+    wakes the drainer once. Returns the number of notifications received.
+    """
+    received = 0
+    wait = timeout
+    window_end = None
+    while wait > 0 and select.select([conn], [], [], wait)[0]:
+        conn.poll()
+        received += len(conn.notifies)
+        conn.notifies.clear()
+        window_end = window_end or time.monotonic() + coalesce
+        wait = window_end - time.monotonic()
+    return received
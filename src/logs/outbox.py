@@ -0,0 +1,25 @@
+from django.conf import settings
+
+from core.use_case import EmittedEvent
+from logs.models import OutboxLog
+from logs.notifications import notify_outbox
+
+OUTBOX_BULK_CREATE_BATCH_SIZE = 1000
+
+
+def write_outbox_events(events: list[EmittedEvent]) -> None:
+    """Event writer of use cases: one outbox row per event, written in a single INSERT."""
+    OutboxLog.objects.bulk_create(
+        [
+            OutboxLog(
+                event_type=emitted.registered.name,
+                event_date_time=emitted.emitted_at,
+                environment=settings.ENVIRONMENT,
+                event_context=emitted.registered.serialize(emitted.event),
+                metadata_version=emitted.registered.version,
+            )
+            for emitted in events
+        ],
+        batch_size=OUTBOX_BULK_CREATE_BATCH_SIZE,
+    )
+    notify_outbox()
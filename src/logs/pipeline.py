@@ -0,0 +1,182 @@
+import asyncio
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import TypeVar
+
+import structlog
+from django.conf import settings
+from django.db import connection
+
+from core.circuit_breaker import get_clickhouse_breaker
+from logs.batching import get_batch_size_controller
+from logs.metrics import BATCH_SIZE, FETCH_SECONDS
+from logs.services import (
+    BatchStats,
+    DrainResult,
+    claim_logs,
+    fetch_columns,
+    finish_delivery,
+    get_worker_id,
+    insert_log_columns,
+    release_logs,
+)
+from logs.sharding import OutboxShard
+
+logger = structlog.get_logger(__name__)
+
+STAGES = ("fetch", "insert", "mark")
+
+T = TypeVar("T")
+
+# queued after the last batch
+_DONE = None
+
+
+class PipelinedDrain:
+    """
+    Drain the outbox with fetching, inserting and marking running at the same time.
+
+    Every stage runs on its own thread, and so with its own database
+    connection, and hands batches to the next one through a queue holding
+    at most `depth` batches: while batch N is inserted into ClickHouse,
+    batch N+1 is fetched and batch N-1 marked processed. A full queue holds
+    back the stage feeding it, which bounds how many rows are leased but
+    not yet delivered.
+
+    Without a `batch_size` every batch takes the current adaptive size,
+    which the sequential drainers keep tuning.
+
+    Each batch carries its own BatchStats through the stages and is added
+    to `stats` on the event loop once marked; only the set of leased rows
+    is shared between the threads.
+    """
+
+    def __init__(
+        self,
+        batch_size: int | None,
+        depth: int,
+        time_budget: float,
+        shard: OutboxShard | None = None,
+        stats: BatchStats | None = None,
+    ) -> None:
+        self._batch_size = batch_size
+        self._shard = shard
+        self._depth = depth
+        self._time_budget = time_budget
+        self._worker_id = get_worker_id()
+        self._breaker = get_clickhouse_breaker()
+        self._controller = get_batch_size_controller() if batch_size is None else None
+        # claimed rows that are not marked processed yet, released on failure
+        self._leased: set[int] = set()
+        self._leased_lock = threading.Lock()
+        self.stats = stats or BatchStats()
+        self.result = DrainResult()
+
+    async def run(self) -> DrainResult:
+        executors = {
+            stage: ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"outbox-{stage}") for stage in STAGES
+        }
+        inserts = asyncio.Queue(maxsize=self._depth)
+        marks = asyncio.Queue(maxsize=self._depth)
+        try:
+            async with asyncio.TaskGroup() as group:
+                group.create_task(self._fetch(executors["fetch"], inserts))
+                group.create_task(self._insert(executors["insert"], inserts, marks))
+                group.create_task(self._mark(executors["mark"], marks))
+        except ExceptionGroup as e:
+            # a claim still in flight commits its lease after the failure, wait for it before releasing
+            self._shutdown(executors.pop("fetch"))
+            await self._run(executors["mark"], release_logs, list(self._leased), self._worker_id)
+            logger.error("Pipelined outbox drain failed", worker_id=self._worker_id, error=str(e.exceptions[0]))
+            raise e.exceptions[0] from None
+        finally:
+            for executor in executors.values():
+                self._shutdown(executor)
+        return self.result
+
+    @staticmethod
+    def _shutdown(executor: ThreadPoolExecutor) -> None:
+        # django connections are per thread, close them on the thread that opened them
+        executor.submit(connection.close)
+        executor.shutdown()
+
+    async def _fetch(self, executor: ThreadPoolExecutor, inserts: asyncio.Queue) -> None:
+        deadline = time.monotonic() + self._time_budget
+        last_id = 0
+        while True:
+            batch = await self._run(executor, self._fetch_batch, last_id)
+            if batch is None:
+                break
+            log_ids, batch_size, _, _ = batch
+            last_id = log_ids[-1]
+            await inserts.put(batch)
+            self.result.batch_size = batch_size
+            self.result.backlog = len(log_ids) >= batch_size
+            if not self.result.backlog or time.monotonic() >= deadline:
+                break
+        await inserts.put(_DONE)
+
+    async def _insert(self, executor: ThreadPoolExecutor, inserts: asyncio.Queue, marks: asyncio.Queue) -> None:
+        while (batch := await inserts.get()) is not _DONE:
+            log_ids, _, columns, stats = batch
+            failed = await self._run(executor, insert_log_columns, columns, log_ids, stats)
+            await marks.put((log_ids, failed, stats))
+        await marks.put(_DONE)
+
+    async def _mark(self, executor: ThreadPoolExecutor, marks: asyncio.Queue) -> None:
+        while (batch := await marks.get()) is not _DONE:
+            log_ids, failed, stats = batch
+            await self._run(executor, finish_delivery, log_ids, failed, self._worker_id, stats)
+            with self._leased_lock:
+                self._leased.difference_update(log_ids)
+            self._add_stats(stats)
+            self.result.processed += len(log_ids)
+            self.result.batches += 1
+
+    def _add_stats(self, stats: BatchStats) -> None:
+        self.stats.delivered += stats.delivered
+        self.stats.fetch_seconds += stats.fetch_seconds
+        self.stats.insert_seconds += stats.insert_seconds
+        self.stats.mark_seconds += stats.mark_seconds
+        self.stats.payload_bytes += stats.payload_bytes
+        self.stats.wire_bytes += stats.wire_bytes
+
+    def _fetch_batch(self, after_id: int) -> tuple[list[int], int, list[list], BatchStats] | None:
+        if not self._breaker.allow():
+            logger.info("ClickHouse circuit is open, skipping", worker_id=self._worker_id)
+            return None
+        # ramps back up to the full batch size after an outage
+        batch_size = self._breaker.scale(self._controller.current if self._controller else self._batch_size)
+        started = time.perf_counter()
+        log_ids = claim_logs(batch_size, self._worker_id, after_id=after_id, shard=self._shard)
+        if not log_ids:
+            return None
+        with self._leased_lock:
+            self._leased.update(log_ids)
+        columns = fetch_columns(log_ids, self._worker_id)
+        stats = BatchStats(log_ids=log_ids, fetch_seconds=time.perf_counter() - started)
+        FETCH_SECONDS.observe(stats.fetch_seconds)
+        BATCH_SIZE.observe(len(log_ids))
+        return log_ids, batch_size, columns, stats
+
+    async def _run(self, executor: ThreadPoolExecutor, func: Callable[..., T], *args: object) -> T:
+        return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+
+async def drain_pipelined(
+    batch_size: int | None = None,
+    depth: int | None = None,
+    time_budget: float | None = None,
+    shard: OutboxShard | None = None,
+    stats: BatchStats | None = None,
+) -> DrainResult:
+    """Pipelined counterpart of `drain_logs`, see PipelinedDrain."""
+    return await PipelinedDrain(
+        batch_size,
+        depth=depth or settings.OUTBOX_PIPELINE_DEPTH,
+        time_budget=settings.OUTBOX_DRAIN_TIME_BUDGET if time_budget is None else time_budget,
+        shard=shard,
+        stats=stats,
+    ).run()
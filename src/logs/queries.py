@@ -0,0 +1,256 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Iterator
+from datetime import UTC, datetime
+from typing import Annotated, Any, Literal, NamedTuple
+
+from clickhouse_connect.driver.binding import DT64Param
+from django.conf import settings
+from pydantic import Field, StringConstraints
+
+from core.base_model import Model
+from core.event_log_client import EVENT_LOG_COLUMNS, EventLogClient
+from core.events import projected_columns
+from core.serialization import decode_event_context, json_dumps, json_loads
+from logs.metrics import EVENT_LOG_QUERY_CACHE, EVENT_LOG_QUERY_SECONDS, EVENT_LOG_ROLLUP_QUERIES
+
+
+class Rollup(NamedTuple):
+    table: str | None
+    # ClickHouse function truncating a time to the grain
+    truncate: str
+    # time fields that are zero at a grain boundary
+    aligned_fields: tuple[str, ...]
+
+
+# finest to coarsest; tables are created by docker/clickhouse/migrations/0001_event_counts_rollups.sql
+ROLLUPS = {
+    'minute': Rollup('event_counts_1m', 'toStartOfMinute', ('microsecond', 'second')),
+    'hour': Rollup('event_counts_1h', 'toStartOfHour', ('microsecond', 'second', 'minute')),
+    'day': Rollup('event_counts_1d', 'toStartOfDay', ('microsecond', 'second', 'minute', 'hour')),
+}
+
+
+class EventLogFilter(Model):
+    """Filters of an event_log read, all bound as query parameters."""
+
+    event_types: list[str] = []
+    environment: str | None = None
+    start: datetime | None = None
+    end: datetime | None = None
+    # event_context field equality filters
+    context: dict[Annotated[str, StringConstraints(pattern=r'^[A-Za-z_][A-Za-z0-9_]*$')], str] = {}
+
+    def where(self, time_column: str = 'event_date_time') -> tuple[str, dict[str, Any]]:
+        # filters follow the (event_date_time, event_type) sorting key,
+        # so the time range prunes parts and granules first
+        conditions: list[str] = []
+        parameters: dict[str, Any] = {}
+        self._range_conditions(time_column, conditions, parameters)
+        self._column_conditions(conditions, parameters)
+        self._context_conditions(conditions, parameters)
+        return (f' WHERE {" AND ".join(conditions)}' if conditions else ''), parameters
+
+    def _range_conditions(self, time_column: str, conditions: list[str], parameters: dict[str, Any]) -> None:
+        # DT64Param keeps the microseconds a plain datetime parameter is formatted without
+        if self.start is not None:
+            conditions.append(f'{time_column} >= {{start:DateTime64(6)}}')
+            parameters['start'] = DT64Param(self.start)
+        if self.end is not None:
+            conditions.append(f'{time_column} < {{end:DateTime64(6)}}')
+            parameters['end'] = DT64Param(self.end)
+
+    def _column_conditions(self, conditions: list[str], parameters: dict[str, Any]) -> None:
+        if self.event_types:
+            conditions.append('event_type IN {event_types:Array(String)}')
+            parameters['event_types'] = sorted(set(self.event_types))
+        if self.environment:
+            conditions.append('environment = {environment:String}')
+            parameters['environment'] = self.environment
+
+    def _context_conditions(self, conditions: list[str], parameters: dict[str, Any]) -> None:
+        projections = projected_columns()
+        for index, (field, value) in enumerate(sorted(self.context.items())):
+            projection = projections.get(f'context_{field}')
+            if projection is not None:
+                # typed column with a bloom filter instead of parsing every row's JSON
+                conditions.append(f'{projection.column} = {{context_{index}:{projection.clickhouse_type}}}')
+            else:
+                conditions.append(f'JSONExtractString(event_context, {{context_{index}_field:String}}) = '
+                                  f'{{context_{index}:String}}')
+                parameters[f'context_{index}_field'] = field
+            parameters[f'context_{index}'] = value
+
+
+class EventLogQuery(EventLogFilter):
+    limit: int | None = Field(default=None, ge=1)
+
+    def to_sql(self) -> tuple[str, dict[str, Any]]:
+        where, parameters = self.where()
+        # table names come from settings, every value is a bound parameter
+        sql = (
+            f'SELECT {", ".join(EVENT_LOG_COLUMNS)} '  # noqa: S608
+            f'FROM {settings.CLICKHOUSE_SCHEMA}.{settings.CLICKHOUSE_EVENT_LOG_TABLE_NAME}'
+            f'{where} ORDER BY event_date_time, event_type'
+        )
+        if self.limit is not None:
+            sql += ' LIMIT {limit:UInt32}'
+            parameters['limit'] = self.limit
+        return sql, parameters
+
+
+class EventCountQuery(EventLogFilter):
+    """Event counts per `interval` bucket and event type."""
+
+    interval: Literal['minute', 'hour', 'day'] = 'hour'
+
+    def rollup(self) -> Rollup:
+        """
+        The coarsest rollup whose buckets fit the query: no coarser than the
+        interval, with the time range on its bucket boundaries. Falls back
+        to scanning event_log, also when filtering on event_context.
+
+        Rollups count inserted rows, so an event delivered twice stays
+        counted twice there while event_log drops the copy on merge.
+        """
+        if self.context:
+            return ROLLUPS[self.interval]._replace(table=None)
+        grains = list(ROLLUPS)
+        for grain in reversed(grains[:grains.index(self.interval) + 1]):
+            rollup = ROLLUPS[grain]
+            if all(self._is_aligned(bound, rollup) for bound in (self.start, self.end)):
+                return rollup
+        return ROLLUPS[self.interval]._replace(table=None)
+
+    def to_sql(self) -> tuple[str, dict[str, Any]]:
+        rollup = self.rollup()
+        truncate = ROLLUPS[self.interval].truncate
+        if rollup.table is None:
+            where, parameters = self.where()
+            source, bucket, events = settings.CLICKHOUSE_EVENT_LOG_TABLE_NAME, 'event_date_time', 'count()'
+        else:
+            where, parameters = self.where(time_column='bucket')
+            source, bucket, events = rollup.table, 'bucket', 'sum(events)'
+        sql = (
+            f'SELECT {truncate}({bucket}) AS bucket, event_type, {events} AS events '  # noqa: S608
+            f'FROM {settings.CLICKHOUSE_SCHEMA}.{source}{where} '
+            'GROUP BY bucket, event_type ORDER BY bucket, event_type'
+        )
+        return sql, parameters
+
+    @staticmethod
+    def _is_aligned(bound: datetime | None, rollup: Rollup) -> bool:
+        if bound is None:
+            return True
+        # bound like clickhouse_connect binds it: converted to the server's timezone, UTC,
+        # with naive times read as local time; the rollup buckets are UTC too
+        server_time = bound.astimezone(UTC)
+        return not any(getattr(server_time, field) for field in rollup.aligned_fields)
+
+
+class QueryCache:
+    """In-process LRU cache of query results, each entry expiring `ttl` seconds after it was stored."""
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self._max_size = max_size
+        self._ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, object]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(sql: str, parameters: dict[str, Any]) -> str:
+        normalized = re.sub(r'\s+', ' ', sql).strip()
+        values = {name: str(_parameter_value(value)) for name, value in sorted(parameters.items())}
+        return f'{normalized}|{json_dumps(values)}'
+
+    def get(self, key: str) -> object | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: object) -> None:
+        if not self._max_size:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self._ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_cache: QueryCache | None = None
+
+
+def get_query_cache() -> QueryCache:
+    global _cache
+    if _cache is None:
+        _cache = QueryCache(settings.EVENT_LOG_QUERY_CACHE_SIZE, settings.EVENT_LOG_QUERY_CACHE_TTL)
+    return _cache
+
+
+def query_events(query: EventLogQuery) -> list[dict[str, Any]]:
+    """Events matching `query`, served from the result cache while fresh."""
+    return _cached_select(*query.to_sql(), to_result=_to_event)
+
+
+def count_events(query: EventCountQuery) -> list[dict[str, Any]]:
+    """Event counts for `query`, read from the cheapest rollup and cached like `query_events`."""
+    EVENT_LOG_ROLLUP_QUERIES.labels(source=query.rollup().table or 'event_log').inc()
+    return _cached_select(*query.to_sql(), to_result=_to_count)
+
+
+def stream_events(query: EventLogQuery) -> Iterator[dict[str, Any]]:
+    """Events matching `query`, read block by block without holding the result in memory. Never cached."""
+    sql, parameters = query.to_sql()
+    with EventLogClient.init() as client, client.stream(sql, parameters) as blocks:
+        for block in blocks:
+            for row in block:
+                yield _to_event(row)
+
+
+def _cached_select(
+    sql: str, parameters: dict[str, Any], to_result: Callable[[tuple], dict[str, Any]],
+) -> list[dict[str, Any]]:
+    cache = get_query_cache()
+    key = cache.key(sql, parameters)
+    # results are cached as JSON and rebuilt on every hit,
+    # so no caller can change what the next hit gets
+    cached = cache.get(key)
+    if cached is not None:
+        EVENT_LOG_QUERY_CACHE.labels(result='hit').inc()
+        return json_loads(cached)
+    EVENT_LOG_QUERY_CACHE.labels(result='miss').inc()
+    with EVENT_LOG_QUERY_SECONDS.time(), EventLogClient.init() as client:
+        results = [to_result(row) for row in client.select(sql, parameters)]
+    cache.set(key, json_dumps(results))
+    return results
+
+
+def _parameter_value(value: object) -> object:
+    return value.value if isinstance(value, DT64Param) else value
+
+
+def _to_count(row: tuple) -> dict[str, Any]:
+    bucket, event_type, events = row
+    return {'bucket': bucket.isoformat(), 'event_type': event_type, 'events': events}
+
+
+def _to_event(row: tuple) -> dict[str, Any]:
+    event = dict(zip(EVENT_LOG_COLUMNS, row, strict=False))
+    event['event_date_time'] = event['event_date_time'].isoformat()
+    event['event_context'] = decode_event_context(event['event_context'])
+    event['event_id'] = str(event['event_id'])
+    return event
@@ -0,0 +1,74 @@
+import time
+from datetime import timedelta
+
+import structlog
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from core.base_model import Model
+from logs.models import OutboxLog
+
+logger = structlog.get_logger(__name__)
+
+
+class PurgeResult(Model):
+    deleted: int = 0
+    chunks: int = 0
+    seconds: float = 0.0
+    table_bytes: int = 0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.deleted / self.seconds if self.seconds else 0.0
+
+
+def outbox_table_size() -> int:
+    """Total on-disk size of the outbox table including its indexes and TOAST, in bytes."""
+    if connection.vendor != "postgresql":
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_total_relation_size(%s)", [OutboxLog._meta.db_table])
+        return cursor.fetchone()[0]
+
+
+def purge_processed_logs(
+    retention_hours: float | None = None,
+    chunk_size: int | None = None,
+    time_budget: float | None = None,
+) -> PurgeResult:
+    """
+    Delete processed rows older than the retention period in chunks of
+    `chunk_size`. Every chunk is its own short statement, so row locks are
+    held only briefly and drains keep running alongside the purge.
+    """
+    retention_hours = settings.OUTBOX_RETENTION_HOURS if retention_hours is None else retention_hours
+    chunk_size = chunk_size or settings.OUTBOX_PURGE_CHUNK_SIZE
+    time_budget = settings.OUTBOX_PURGE_TIME_BUDGET if time_budget is None else time_budget
+    cutoff = timezone.now() - timedelta(hours=retention_hours)
+    expired = OutboxLog.objects.filter(processed=True).filter(
+        # rows processed before processed_at existed fall back to the event time
+        Q(processed_at__lt=cutoff) | Q(processed_at__isnull=True, event_date_time__lt=cutoff),
+    )
+
+    started = time.monotonic()
+    result = PurgeResult()
+    while time.monotonic() - started < time_budget:
+        log_ids = list(expired.values_list("id", flat=True)[:chunk_size])
+        if not log_ids:
+            break
+        deleted, _ = OutboxLog.objects.filter(id__in=log_ids).delete()
+        result.deleted += deleted
+        result.chunks += 1
+    result.seconds = time.monotonic() - started
+    result.table_bytes = outbox_table_size()
+
+    logger.info(
+        "Purged processed outbox logs",
+        deleted=result.deleted,
+        chunks=result.chunks,
+        rows_per_second=round(result.rows_per_second),
+        table_bytes=result.table_bytes,
+    )
+    return result
@@ -1,53 +1,360 @@
+import os
+import socket
+import time
+import uuid
+from collections.abc import Iterator
+from datetime import timedelta
+from itertools import islice
+
 import structlog
+from clickhouse_connect.driver.exceptions import DatabaseError, OperationalError
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import Q, QuerySet
+from django.utils import timezone
+from sentry_sdk import capture_exception, start_transaction
+
+from core.base_model import Model
+from core.circuit_breaker import get_clickhouse_breaker
+from core.event_log_client import EVENT_LOG_COLUMNS, EventLogBuffer, EventLogClient
+from logs.batching import get_batch_size_controller
+from logs.dead_letters import dead_letter_logs, insert_isolating
+from logs.metrics import (
+    BATCH_SIZE,
+    DRAIN_FAILURES,
+    EVENTS_DEAD_LETTERED,
+    EVENTS_DELIVERED,
+    FETCH_SECONDS,
+    INSERT_SECONDS,
+    INSERT_WIRE_BYTES,
+)
 from logs.models import OutboxLog
-from core.event_log_client import EventLogClient
-from sentry_sdk import start_transaction, capture_exception
-import json
+from logs.sharding import OutboxShard
 
 logger = structlog.get_logger(__name__)
 
-def process_logs(batch_size=100) -> int:    
+
+class DrainResult(Model):
+    processed: int = 0
+    batches: int = 0
+    backlog: bool = False
+    batch_size: int = 0
+
+
+class BatchStats(Model):
+    log_ids: list[int] = []
+    delivered: int = 0
+    fetch_seconds: float = 0.0
+    insert_seconds: float = 0.0
+    mark_seconds: float = 0.0
+    payload_bytes: int = 0
+    # payload_bytes after transport compression
+    wire_bytes: int = 0
+
+
+def get_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def claimable_logs(after_id: int = 0, shard: OutboxShard | None = None) -> QuerySet:
+    """
+    Unprocessed rows without a live lease, walked in id order from `after_id`,
+    optionally limited to one shard. Served by the partial
+    `outbox_unprocessed_idx`, so the scan cost does not depend on how many
+    processed rows are retained.
+    """
+    now = timezone.now()
+    logs = (
+        OutboxLog.objects.filter(processed=False, id__gt=after_id)
+        .filter(Q(locked_until__isnull=True) | Q(locked_until__lt=now))
+        .order_by("id")
+    )
+    return shard.filter(logs) if shard else logs
+
+
+def claim_logs(batch_size: int, worker_id: str, after_id: int = 0, shard: OutboxShard | None = None) -> list[int]:
+    """
+    Lease up to `batch_size` unprocessed rows to `worker_id`.
+
+    Rows locked by a concurrent claim are skipped, so parallel drainers
+    always get disjoint batches. Leases of crashed workers expire after
+    OUTBOX_LEASE_SECONDS and the rows become claimable again.
+    """
+    with db_transaction.atomic():
+        log_ids = list(
+            claimable_logs(after_id, shard)
+            .select_for_update(skip_locked=True)
+            .values_list("id", flat=True)[:batch_size],
+        )
+        if log_ids:
+            OutboxLog.objects.filter(id__in=log_ids).update(
+                locked_by=worker_id,
+                locked_until=timezone.now() + timedelta(seconds=settings.OUTBOX_LEASE_SECONDS),
+            )
+    return log_ids
+
+
+def release_logs(log_ids: list[int], worker_id: str) -> None:
+    OutboxLog.objects.filter(id__in=log_ids, locked_by=worker_id).update(
+        locked_by=None, locked_until=None,
+    )
+
+
+def mark_processed(log_ids: list[int], worker_id: str) -> None:
+    OutboxLog.objects.filter(id__in=log_ids, locked_by=worker_id).update(
+        processed=True, processed_at=timezone.now(), locked_by=None, locked_until=None,
+    )
+
+
+def deliver_columns(
+    columns: list[list], log_ids: list[int], worker_id: str, stats: BatchStats | None = None,
+) -> int:
+    """
+    Insert a leased batch and mark it processed. Rows ClickHouse rejects are
+    isolated and moved to the dead-letter queue so the rest still goes through.
+    Returns the number of delivered rows; timings are added to `stats`.
+    """
+    stats = stats or BatchStats()
+    failed = insert_log_columns(columns, log_ids, stats)
+    return finish_delivery(log_ids, failed, worker_id, stats)
+
+
+def insert_log_columns(columns: list[list], log_ids: list[int], stats: BatchStats) -> dict[int, str]:
+    """The ClickHouse half of `deliver_columns`. Returns {log_id: error} for rejected rows."""
+    breaker = get_clickhouse_breaker()
+    started = time.perf_counter()
+    try:
+        with EventLogClient.init() as client:
+            failed = insert_isolating(client, columns, log_ids)
+    except OperationalError:
+        breaker.record_failure()
+        DRAIN_FAILURES.labels(cause="clickhouse_unavailable").inc()
+        raise
+    except DatabaseError:
+        # a server side failure such as TOO_MANY_PARTS: the batch is released and retried whole
+        breaker.record_failure()
+        DRAIN_FAILURES.labels(cause="clickhouse_error").inc()
+        raise
+    breaker.record_success()
+    insert_seconds = time.perf_counter() - started
+    stats.insert_seconds += insert_seconds
+    stats.payload_bytes += client.written_bytes
+    stats.wire_bytes += client.wire_bytes
+    INSERT_SECONDS.observe(insert_seconds)
+    INSERT_WIRE_BYTES.observe(client.wire_bytes)
+    return failed
+
+
+def finish_delivery(log_ids: list[int], failed: dict[int, str], worker_id: str, stats: BatchStats) -> int:
+    """The outbox half of `deliver_columns`: dead-letter rejected rows, mark the batch processed."""
+    started = time.perf_counter()
+    with db_transaction.atomic():
+        if failed:
+            dead_letter_logs(failed)
+        mark_processed(log_ids, worker_id)
+    stats.mark_seconds += time.perf_counter() - started
+    delivered = len(log_ids) - len(failed)
+    stats.delivered += delivered
+    EVENTS_DELIVERED.inc(delivered)
+    EVENTS_DEAD_LETTERED.inc(len(failed))
+    return delivered
+
+
+def fetch_columns(log_ids: list[int], worker_id: str) -> list[list]:
+    """
+    Read the leased rows as per-column lists in EVENT_LOG_COLUMNS order,
+    ready for a column-oriented insert without building model instances.
+    event_context stays decoded; the client encodes it exactly once.
+    """
+    rows = (
+        OutboxLog.objects.filter(id__in=log_ids, locked_by=worker_id)
+        .order_by("id")
+        .values_list(*EVENT_LOG_COLUMNS)
+    )
+    return [list(column) for column in zip(*rows, strict=False)]
+
+
+def stream_columns(log_ids: list[int], worker_id: str, chunk_size: int) -> Iterator[tuple[list[list], list[int]]]:
+    """
+    Like `fetch_columns`, but read through a server-side cursor and yielded
+    as (columns, log_ids) chunks of at most `chunk_size` rows, so memory
+    stays bounded by the chunk instead of the whole batch.
+    """
+    rows = (
+        OutboxLog.objects.filter(id__in=log_ids, locked_by=worker_id)
+        .order_by("id")
+        .values_list("id", *EVENT_LOG_COLUMNS)
+        .iterator(chunk_size=chunk_size)
+    )
+    while chunk := list(islice(rows, chunk_size)):
+        chunk_ids, *columns = (list(column) for column in zip(*chunk, strict=False))
+        yield columns, chunk_ids
+
+
+def process_logs(batch_size: int = 100, worker_id: str | None = None, buffer: EventLogBuffer | None = None) -> int:
+    """
+    Deliver one claimed batch. With a `buffer` the batch is only queued
+    there and its rows are marked processed when the buffer flushes.
+    """
+    return len(_process_batch(batch_size, worker_id or get_worker_id(), buffer).log_ids)
+
+
+def _process_batch(
+    batch_size: int,
+    worker_id: str,
+    buffer: EventLogBuffer | None = None,
+    after_id: int = 0,
+    shard: OutboxShard | None = None,
+) -> BatchStats:
+    stats = BatchStats()
     with start_transaction(op="log_processing", name="process_logs") as transaction:
-        logs = OutboxLog.objects.filter(processed=False)[:batch_size]
-        if not logs:
-            logger.info("No logs to process", transaction_id=transaction.trace_id)
-            return 0
-        
+        started = time.perf_counter()
+        log_ids = _claim_batch(batch_size, worker_id, after_id, shard, transaction.trace_id)
+        if not log_ids:
+            return stats
+
+        stats.log_ids = log_ids
+        BATCH_SIZE.observe(len(log_ids))
         logger.info("Processing logs",
                     transaction_id=transaction.trace_id,
-                    log_count=len(logs)
+                    worker_id=worker_id,
+                    log_count=len(log_ids),
                     )
-        
-        data_to_insert = []
-        for log in logs:
-            try:               
-                data_to_insert.append({
-                    "event_type": log.event_type,
-                    "event_date_time": log.event_date_time,
-                    "environment": log.environment,
-                    "event_context": json.dumps(log.event_context),
-                    "metadata_version": log.metadata_version,
-                })
-            except Exception as e:
-                logger.error("Error parsing event context", event_id=log.id, error=str(e))
-                capture_exception(e)
-                continue
-                
-        with EventLogClient.init() as client:
-            try:
-                client.insert(data=data_to_insert)
-                log_ids = [log.id for log in logs] 
-                OutboxLog.objects.filter(id__in=log_ids).update(processed=True)                
-                logger.info(
-                    "Successfully processed logs", 
-                    transaction_id=transaction.trace_id,                       
-                    processed_count=len(data_to_insert),
+
+        if buffer is not None:
+            buffer.add(fetch_columns(log_ids, worker_id), keys=log_ids)
+            stats.fetch_seconds = time.perf_counter() - started
+            FETCH_SECONDS.observe(stats.fetch_seconds)
+            return stats
+
+        try:
+            _stream_batch(log_ids, worker_id, stats, started)
+        except Exception as e:
+            _release_failed_batch(e, log_ids, worker_id, transaction.trace_id)
+            raise
+        logger.info(
+            "Successfully processed logs",
+            transaction_id=transaction.trace_id,
+            processed_count=stats.delivered,
+            dead_lettered_count=len(log_ids) - stats.delivered,
+            payload_bytes=stats.payload_bytes,
+            wire_bytes=stats.wire_bytes,
+        )
+        return stats
+
+
+def _claim_batch(
+    batch_size: int, worker_id: str, after_id: int, shard: OutboxShard | None, trace_id: str,
+) -> list[int]:
+    if not get_clickhouse_breaker().allow():
+        # clickhouse is down: skip before touching the outbox at all
+        logger.info("ClickHouse circuit is open, skipping", transaction_id=trace_id)
+        DRAIN_FAILURES.labels(cause="circuit_open").inc()
+        return []
+    log_ids = claim_logs(batch_size, worker_id, after_id=after_id, shard=shard)
+    if not log_ids:
+        logger.info("No logs to process", transaction_id=trace_id)
+    return log_ids
+
+
+def _stream_batch(log_ids: list[int], worker_id: str, stats: BatchStats, started: float) -> None:
+    # each chunk is inserted and marked processed before the next one is read
+    for columns, chunk_ids in stream_columns(log_ids, worker_id, settings.OUTBOX_STREAM_CHUNK_SIZE):
+        stats.fetch_seconds += time.perf_counter() - started
+        deliver_columns(columns, chunk_ids, worker_id, stats=stats)
+        started = time.perf_counter()
+    stats.fetch_seconds += time.perf_counter() - started
+    FETCH_SECONDS.observe(stats.fetch_seconds)
+
+
+def _release_failed_batch(error: Exception, log_ids: list[int], worker_id: str, trace_id: str) -> None:
+    release_logs(log_ids, worker_id)
+    if not isinstance(error, DatabaseError):
+        # clickhouse errors are already counted by insert_log_columns
+        DRAIN_FAILURES.labels(cause=type(error).__name__).inc()
+    capture_exception(error)
+    logger.error("Error processing logs",
+                transaction_id=trace_id,
+                error=str(error),
                 )
-                return len(data_to_insert)                
-            except Exception as e:
-                capture_exception(e)
-                logger.error("Error processing logs", 
-                            transaction_id=transaction.trace_id, 
-                            error=str(e)
-                            )
-                raise
+
+
+def drain_logs(
+    batch_size: int | None = None, time_budget: float | None = None, shard: OutboxShard | None = None,
+) -> DrainResult:
+    """
+    Keep processing batches until the outbox (or its `shard`) is empty or
+    `time_budget` seconds have passed. `backlog` is set when the run stopped on the budget
+    while full batches were still coming in.
+
+    Without an explicit `batch_size` the size adapts to the observed fetch
+    and insert latency, see AdaptiveBatchSize.
+
+    Batches are fetched with keyset pagination (`id > last claimed id`);
+    rows skipped because another worker held them are picked up by the
+    next run.
+    """
+    time_budget = settings.OUTBOX_DRAIN_TIME_BUDGET if time_budget is None else time_budget
+    worker_id = get_worker_id()
+    buffer = _get_buffer(worker_id)
+    try:
+        result = _drain_batches(batch_size, time.monotonic() + time_budget, worker_id, buffer, shard)
+        if buffer is not None:
+            buffer.flush()
+    except Exception:
+        if buffer is not None:
+            release_logs(buffer.keys, worker_id)
+        raise
+    return result
+
+
+def _drain_batches(
+    batch_size: int | None, deadline: float, worker_id: str, buffer: EventLogBuffer | None, shard: OutboxShard | None,
+) -> DrainResult:
+    breaker = get_clickhouse_breaker()
+    controller = get_batch_size_controller() if batch_size is None else None
+    result = DrainResult()
+    last_id = 0
+    while True:
+        # ramps back up to the full batch size after an outage
+        current_batch_size = breaker.scale(controller.current if controller else batch_size)
+        stats = _process_batch(current_batch_size, worker_id, buffer=buffer, after_id=last_id, shard=shard)
+        processed_count = len(stats.log_ids)
+        last_id = stats.log_ids[-1] if stats.log_ids else last_id
+        if controller and processed_count:
+            controller.observe(
+                current_batch_size,
+                rows=processed_count,
+                seconds=stats.fetch_seconds + stats.insert_seconds,
+                payload_bytes=stats.payload_bytes,
+            )
+        result.processed += processed_count
+        result.batches += 1
+        result.batch_size = current_batch_size
+        result.backlog = processed_count >= current_batch_size
+        if not result.backlog or time.monotonic() >= deadline:
+            return result
+
+
+def _get_buffer(worker_id: str) -> EventLogBuffer | None:
+    if not settings.CLICKHOUSE_BUFFER_MAX_ROWS:
+        return None
+    return EventLogBuffer(
+        max_rows=settings.CLICKHOUSE_BUFFER_MAX_ROWS,
+        max_age=settings.CLICKHOUSE_BUFFER_MAX_AGE,
+        on_flush=lambda columns, log_ids: _deliver_buffered(columns, log_ids, worker_id),
+    )
+
+
+def _deliver_buffered(columns: list[list], log_ids: list[int], worker_id: str) -> int:
+    stats = BatchStats()
+    delivered = deliver_columns(columns, log_ids, worker_id, stats=stats)
+    logger.info(
+        "Flushed buffered logs",
+        worker_id=worker_id,
+        processed_count=delivered,
+        dead_lettered_count=len(log_ids) - delivered,
+        payload_bytes=stats.payload_bytes,
+        wire_bytes=stats.wire_bytes,
+    )
+    return delivered
@@ -0,0 +1,70 @@
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import QuerySet
+from django.db.models.functions import Mod
+from django.db.models.lookups import Exact
+
+
+class OutboxShard(NamedTuple):
+    """
+    A slice of the outbox drained by its own task chains.
+
+    A shard listing `event_types` owns those types. Every other event goes to
+    one of the remaining shards by `id % hash_count`. Chains of a shard run on
+    its Celery `queue` (the default queue when None) with its `priority`, so
+    each shard can get dedicated workers. A shard is drained in id order;
+    with `workers` above 1 its chains run concurrently and strict ordering
+    is traded for throughput.
+    """
+
+    name: str
+    workers: int
+    queue: str | None = None
+    priority: int | None = None
+    event_types: tuple[str, ...] = ()
+    # types owned by the event type shards, excluded from the hash shards
+    reserved_types: tuple[str, ...] = ()
+    hash_index: int = 0
+    hash_count: int = 1
+
+    def filter(self, logs: QuerySet) -> QuerySet:
+        if self.event_types:
+            return logs.filter(event_type__in=self.event_types)
+        if self.reserved_types:
+            logs = logs.exclude(event_type__in=self.reserved_types)
+        if self.hash_count > 1:
+            logs = logs.filter(Exact(Mod("id", self.hash_count), self.hash_index))
+        return logs
+
+
+def get_shards(workers: int | None = None) -> list[OutboxShard]:
+    """Shards configured in OUTBOX_SHARDS; `workers` overrides their chain count."""
+    config = settings.OUTBOX_SHARDS
+    reserved = [event_type for shard in config.values() for event_type in shard.get("event_types", ())]
+    if len(reserved) != len(set(reserved)):
+        raise ImproperlyConfigured("OUTBOX_SHARDS: an event type is assigned to more than one shard")
+    hash_shards = [name for name, shard in config.items() if not shard.get("event_types")]
+    if not hash_shards:
+        raise ImproperlyConfigured("OUTBOX_SHARDS: at least one shard must take the unlisted event types")
+    return [
+        OutboxShard(
+            name=name,
+            workers=workers or shard.get("workers", settings.OUTBOX_DRAIN_WORKERS),
+            queue=shard.get("queue"),
+            priority=shard.get("priority"),
+            event_types=tuple(shard.get("event_types", ())),
+            reserved_types=() if shard.get("event_types") else tuple(reserved),
+            hash_index=hash_shards.index(name) if name in hash_shards else 0,
+            hash_count=len(hash_shards),
+        )
+        for name, shard in config.items()
+    ]
+
+
+def get_shard(name: str) -> OutboxShard:
+    for shard in get_shards():
+        if shard.name == name:
+            return shard
+    raise LookupError(f"unknown outbox shard {name!r}")
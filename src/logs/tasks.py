@@ -1,29 +1,131 @@
 import structlog
-from celery import shared_task
-from logs.services import process_logs
+from celery import Task, shared_task
+from django.conf import settings
+from django.core.cache import cache
 from sentry_sdk import start_transaction
 
+from logs.dead_letters import retry_dead_letters
+from logs.retention import purge_processed_logs
+from logs.services import DrainResult, drain_logs
+from logs.sharding import OutboxShard, get_shard, get_shards
+
 logger = structlog.get_logger(__name__)
 
+DRAIN_SLOT_KEY = "outbox-drain-slot:{shard}:{slot}"
+
+
+def _drain_slot_ttl(countdown: float) -> int:
+    # outlives one drain run plus its countdown, so a dead chain frees its slot
+    return int(countdown + settings.OUTBOX_DRAIN_TIME_BUDGET + 60)
+
+
+def _routing(shard: OutboxShard | None) -> dict:
+    if shard is None:
+        return {}
+    return {option: getattr(shard, option) for option in ("queue", "priority") if getattr(shard, option) is not None}
+
+
+def _next_idle_delay(idle_delay: float, processed_count: int) -> float:
+    if processed_count:
+        return settings.OUTBOX_IDLE_BACKOFF_MIN
+    return idle_delay * 2 or settings.OUTBOX_IDLE_BACKOFF_MIN
+
+
 @shared_task(bind=True)
-def process_outbox_task(self, *args, **kwargs):
+def process_outbox_task(
+    self: Task,
+    batch_size: int | None = None,
+    slot: int | None = None,
+    idle_delay: float = 0.0,
+    shard: str | None = None,
+) -> int:
+    slot_key = DRAIN_SLOT_KEY.format(shard=shard, slot=slot) if slot is not None else None
+    result = _drain(self, batch_size, shard, slot_key)
+    if slot is not None:
+        _continue_chain(self, result, batch_size, slot, idle_delay, shard)
+    return result.processed
+
+
+def _drain(task: Task, batch_size: int | None, shard: str | None, slot_key: str | None) -> DrainResult:
     with start_transaction(op="celery_task", name="process_outbox_task") as transaction:
-        logger.info("Starting outbox processing", 
-                    task_id=self.request.id, 
-                    transaction_id=transaction.trace_id
+        logger.info("Starting outbox processing",
+                    task_id=task.request.id,
+                    transaction_id=transaction.trace_id,
+                    shard=shard,
                     )
         try:
-            processed_count = process_logs()
-            logger.info(
-                "Completed outbox processing",
-                task_id=self.request.id,
-                transaction_id=transaction.trace_id,
-                processed_count=processed_count,
-            )
+            result = drain_logs(batch_size=batch_size, shard=get_shard(shard) if shard else None)
         except Exception as e:
-            logger.error("Failed to process outbox logs", 
-                        task_id=self.request.id, 
-                        transaction_id=transaction.trace_id, 
-                        error=str(e)
+            if slot_key is not None:
+                cache.delete(slot_key)
+            logger.error("Failed to process outbox logs",
+                        task_id=task.request.id,
+                        transaction_id=transaction.trace_id,
+                        error=str(e),
                         )
             raise
+        logger.info(
+            "Completed outbox processing",
+            task_id=task.request.id,
+            transaction_id=transaction.trace_id,
+            shard=shard,
+            processed_count=result.processed,
+            batches=result.batches,
+            backlog=result.backlog,
+            batch_size=result.batch_size,
+        )
+        return result
+
+
+def _continue_chain(
+    task: Task, result: DrainResult, batch_size: int | None, slot: int, idle_delay: float, shard: str | None,
+) -> None:
+    """Re-enqueue the drain chain holding `slot`, right away on a backlog and backing off while idle."""
+    slot_key = DRAIN_SLOT_KEY.format(shard=shard, slot=slot)
+    countdown = 0.0 if result.backlog else _next_idle_delay(idle_delay, result.processed)
+    if countdown > settings.OUTBOX_IDLE_BACKOFF_MAX:
+        # idle long enough: release the slot and let beat restart the chain
+        cache.delete(slot_key)
+        return
+
+    cache.set(slot_key, task.request.id, timeout=_drain_slot_ttl(countdown))
+    task.apply_async(
+        kwargs={"batch_size": batch_size, "slot": slot, "idle_delay": countdown, "shard": shard},
+        countdown=countdown,
+        **_routing(get_shard(shard) if shard else None),
+    )
+
+
+@shared_task
+def dispatch_outbox_task(batch_size: int | None = None, workers: int | None = None) -> None:
+    """
+    Start a continuous drain chain for every free slot of every shard. A
+    chain re-enqueues itself right away while there is a backlog and backs
+    off while idle, so beat only has to revive chains that have stopped.
+    Chains go to their shard's queue, so each shard scales with the workers
+    consuming that queue.
+    """
+    started = 0
+    for shard in get_shards(workers):
+        for slot in range(shard.workers):
+            if cache.add(DRAIN_SLOT_KEY.format(shard=shard.name, slot=slot), "starting", timeout=_drain_slot_ttl(0)):
+                process_outbox_task.apply_async(
+                    kwargs={"batch_size": batch_size, "slot": slot, "shard": shard.name},
+                    **_routing(shard),
+                )
+                started += 1
+    logger.info("Dispatched outbox drain tasks", shards=len(settings.OUTBOX_SHARDS), started=started)
+
+
+@shared_task
+def purge_outbox_task() -> int:
+    with start_transaction(op="celery_task", name="purge_outbox_task"):
+        return purge_processed_logs().deleted
+
+
+@shared_task
+def retry_dead_letters_task() -> int:
+    with start_transaction(op="celery_task", name="retry_dead_letters_task"):
+        delivered_count = retry_dead_letters()
+        logger.info("Retried dead-lettered outbox logs", delivered_count=delivered_count)
+        return delivered_count
@@ -0,0 +1,42 @@
+import pytest
+from django.core.cache import cache
+from pytest_django.fixtures import SettingsWrapper
+
+from logs.batching import AdaptiveBatchSize
+
+
+@pytest.fixture(autouse=True)
+def f_cache(settings: SettingsWrapper) -> None:
+    settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    cache.clear()
+
+
+@pytest.fixture
+def f_controller() -> AdaptiveBatchSize:
+    return AdaptiveBatchSize(
+        initial=100,
+        min_size=10,
+        max_size=250,
+        target_seconds=1.0,
+        max_bytes=1000,
+        increase_step=100,
+        decrease_factor=0.5,
+    )
+
+
+def test_fast_full_batches_grow_additively_up_to_the_max(f_controller: AdaptiveBatchSize) -> None:
+    assert f_controller.current == 100
+    assert f_controller.observe(100, rows=100, seconds=0.2, payload_bytes=100) == 200
+    assert f_controller.observe(200, rows=200, seconds=0.2, payload_bytes=100) == 250
+    assert f_controller.current == 250
+
+
+def test_slow_or_heavy_batches_shrink_multiplicatively_down_to_the_min(f_controller: AdaptiveBatchSize) -> None:
+    assert f_controller.observe(100, rows=100, seconds=2.0, payload_bytes=100) == 50
+    assert f_controller.observe(50, rows=50, seconds=0.2, payload_bytes=5000) == 25
+    assert f_controller.observe(25, rows=10, seconds=3.0, payload_bytes=100) == 12
+    assert f_controller.observe(12, rows=10, seconds=3.0, payload_bytes=100) == 10
+
+
+def test_partial_batches_keep_the_size(f_controller: AdaptiveBatchSize) -> None:
+    assert f_controller.observe(100, rows=30, seconds=0.2, payload_bytes=100) == 100
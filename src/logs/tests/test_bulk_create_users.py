@@ -0,0 +1,53 @@
+from collections.abc import Iterator
+from typing import Never
+
+import pytest
+
+from logs.models import OutboxLog
+from users.models import User
+from users.use_cases import BulkCreateUsers, BulkCreateUsersRequest, CreateUser, CreateUserRequest
+
+pytestmark = [pytest.mark.django_db]
+
+
+@pytest.fixture()
+def f_use_case() -> BulkCreateUsers:
+    return BulkCreateUsers()
+
+
+@pytest.fixture(autouse=True)
+def f_clean_up() -> Iterator[None]:
+    OutboxLog.objects.all().delete()
+    yield
+
+
+def test_bulk_create_users_writes_one_event_per_created_user(f_use_case: BulkCreateUsers) -> None:
+    CreateUser().execute(CreateUserRequest(email='existing@test.com', first_name='Old', last_name='User'))
+    OutboxLog.objects.all().delete()
+    request = BulkCreateUsersRequest(users=[
+        CreateUserRequest(email='existing@test.com'),
+        CreateUserRequest(email='bulk_1@test.com', first_name='Bulk', last_name='One'),
+        CreateUserRequest(email='bulk_2@test.com', first_name='Bulk', last_name='Two'),
+        CreateUserRequest(email='bulk_1@test.com'),
+    ])
+
+    response = f_use_case.execute(request)
+
+    assert [user.email for user in response.result] == ['bulk_1@test.com', 'bulk_2@test.com']
+    assert response.skipped == ['existing@test.com', 'bulk_1@test.com']
+    assert User.objects.filter(email__startswith='bulk_').count() == 2
+    assert sorted(OutboxLog.objects.values_list('event_context__email', flat=True)) == [
+        'bulk_1@test.com', 'bulk_2@test.com',
+    ]
+
+
+def test_events_are_not_written_when_use_case_fails(
+    f_use_case: BulkCreateUsers, monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    def fail(*_args: object, **_kwargs: object) -> Never:
+        raise RuntimeError('boom')
+
+    monkeypatch.setattr(User.objects, 'bulk_create', fail)
+    with pytest.raises(RuntimeError):
+        f_use_case.execute(BulkCreateUsersRequest(users=[CreateUserRequest(email='bulk_3@test.com')]))
+    assert OutboxLog.objects.count() == 0
@@ -106,8 +106,7 @@ def test_event_context_is_pydantic_model(f_use_case: CreateUser, f_clickhouse_cl
     log = f_clickhouse_client.query(
         f"SELECT event_context FROM {settings.CLICKHOUSE_EVENT_LOG_TABLE_NAME} WHERE event_type = 'user_created'"
     )
-    event_context_json = json.loads(log.result_rows[0][0])
-    event_context_dict = json.loads(event_context_json) if isinstance(event_context_json, str) else event_context_json
+    event_context_dict = json.loads(log.result_rows[0][0])
     user_model = UserCreated(**event_context_dict)
     assert user_model.email == email
     assert user_model.first_name == "Pydantic"
@@ -0,0 +1,127 @@
+import uuid
+from unittest import mock
+
+import pytest
+from clickhouse_connect.driver.exceptions import DatabaseError, OperationalError
+from django.utils import timezone
+
+from core.event_log_client import EVENT_LOG_COLUMNS, EventLogClient
+from logs.dead_letters import insert_isolating, is_poison, retry_dead_letters
+from logs.models import DeadLetterLog, OutboxLog
+from logs.services import process_logs
+
+CONTEXT_INDEX = EVENT_LOG_COLUMNS.index("event_context")
+PARSE_ERROR = (
+    "HTTPDriver for http://clickhouse:8123 received ClickHouse error code 27\n"
+    " Code: 27. DB::Exception: Cannot parse input: expected '\"' before: 'x'. (CANNOT_PARSE_INPUT_ASSERTION_FAILED)"
+)
+TOO_MANY_PARTS = (
+    "HTTPDriver for http://clickhouse:8123 received ClickHouse error code 252\n"
+    " Code: 252. DB::Exception: Too many parts (300) in table 'default.event_log'. (TOO_MANY_PARTS)"
+)
+
+
+class FakeEventLogClient:
+    """Rejects every batch holding a poison event, like ClickHouse rejects a whole insert."""
+
+    def __init__(self) -> None:
+        self.inserted: list[dict] = []
+
+    def insert_columns(self, columns: list[list]) -> None:
+        if any(context.get("poison") for context in columns[CONTEXT_INDEX]):
+            raise DatabaseError(PARSE_ERROR)
+        self.inserted.extend(columns[CONTEXT_INDEX])
+
+
+def _columns(contexts: list[dict]) -> list[list]:
+    return [[None] * len(contexts) if index != CONTEXT_INDEX else contexts for index in range(len(EVENT_LOG_COLUMNS))]
+
+
+def test_insert_isolating_bisects_down_to_poison_rows() -> None:
+    contexts = [{"n": i, "poison": i in (3, 6)} for i in range(8)]
+    client = FakeEventLogClient()
+
+    failed = insert_isolating(client, _columns(contexts), keys=list(range(8)))
+
+    assert set(failed) == {3, 6}
+    assert sorted(context["n"] for context in client.inserted) == [0, 1, 2, 4, 5, 7]
+
+
+def test_insert_isolating_does_not_bisect_connection_errors() -> None:
+    client = mock.Mock(insert_columns=mock.Mock(side_effect=OperationalError("connection refused")))
+    with pytest.raises(OperationalError):
+        insert_isolating(client, _columns([{}, {}]), keys=[1, 2])
+    assert client.insert_columns.call_count == 1
+
+
+def test_insert_isolating_does_not_bisect_server_errors() -> None:
+    client = mock.Mock(insert_columns=mock.Mock(side_effect=DatabaseError(TOO_MANY_PARTS)))
+    with pytest.raises(DatabaseError):
+        insert_isolating(client, _columns([{}, {}, {}]), keys=[1, 2, 3])
+    assert client.insert_columns.call_count == 1
+
+
+def test_only_data_errors_are_poison() -> None:
+    assert is_poison(DatabaseError(PARSE_ERROR))
+    assert is_poison(TypeError("object of type UUID is not JSON serializable"))
+    assert not is_poison(DatabaseError(TOO_MANY_PARTS))
+    assert not is_poison(DatabaseError("The ClickHouse server returned an error."))
+    assert not is_poison(OperationalError(PARSE_ERROR))
+
+
+@pytest.mark.django_db
+def test_server_error_releases_the_batch_without_dead_lettering() -> None:
+    OutboxLog.objects.all().delete()
+    OutboxLog.objects.bulk_create(
+        OutboxLog(event_type="user_created", environment="Local", event_context={"n": i}) for i in range(3)
+    )
+
+    with mock.patch.object(EventLogClient, "insert_columns", side_effect=DatabaseError(TOO_MANY_PARTS)):
+        with pytest.raises(DatabaseError):
+            process_logs(batch_size=10)
+
+    assert not DeadLetterLog.objects.exists()
+    assert OutboxLog.objects.filter(processed=False, locked_by__isnull=True).count() == 3
+
+
+@pytest.mark.django_db
+def test_poison_event_is_dead_lettered_and_rest_delivered() -> None:
+    OutboxLog.objects.all().delete()
+    OutboxLog.objects.bulk_create(
+        OutboxLog(event_type="user_created", environment="Local", event_context={"n": i, "poison": i == 2})
+        for i in range(5)
+    )
+    client = FakeEventLogClient()
+
+    with mock.patch.object(EventLogClient, "insert_columns", lambda _self, columns: client.insert_columns(columns)):
+        assert process_logs(batch_size=10) == 5
+
+    assert OutboxLog.objects.filter(processed=False).count() == 0
+    assert sorted(context["n"] for context in client.inserted) == [0, 1, 3, 4]
+    dead_letter = DeadLetterLog.objects.get()
+    assert dead_letter.event_context == {"n": 2, "poison": True}
+    assert dead_letter.attempts == 1
+    assert "Cannot parse input" in dead_letter.error
+
+    with mock.patch.object(EventLogClient, "insert_columns", lambda _self, columns: client.insert_columns(columns)):
+        assert retry_dead_letters(DeadLetterLog.objects.all()) == 0
+    dead_letter.refresh_from_db()
+    assert dead_letter.attempts == 2
+    assert dead_letter.next_retry_at > dead_letter.created_at
+
+
+@pytest.mark.django_db
+def test_failed_retry_restores_the_schedule() -> None:
+    DeadLetterLog.objects.all().delete()
+    dead_letter = DeadLetterLog.objects.create(
+        event_id=uuid.uuid4(), event_type="user_created", event_date_time=timezone.now(), environment="Local",
+        event_context={"n": 1}, error=PARSE_ERROR, next_retry_at=None,
+    )
+
+    with mock.patch.object(EventLogClient, "insert_columns", side_effect=OperationalError("connection refused")):
+        with pytest.raises(OperationalError):
+            retry_dead_letters(DeadLetterLog.objects.all())
+
+    dead_letter.refresh_from_db()
+    assert dead_letter.next_retry_at is None
+    assert dead_letter.attempts == 1
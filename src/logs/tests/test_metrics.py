@@ -0,0 +1,21 @@
+import pytest
+from django.test import Client
+
+from logs.models import OutboxLog
+
+pytestmark = [pytest.mark.django_db]
+
+
+def test_metrics_endpoint_reports_outbox_backlog(client: Client) -> None:
+    OutboxLog.objects.all().delete()
+    OutboxLog.objects.bulk_create(
+        OutboxLog(event_type="user_created", environment="Local", event_context={}) for _ in range(3)
+    )
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    body = response.content.decode()
+    assert "outbox_backlog 3.0" in body
+    assert 'circuit_breaker_state{circuit="clickhouse",state="closed"} 1.0' in body
+    assert "outbox_events_delivered_total" in body
@@ -0,0 +1,79 @@
+import socket
+import threading
+import time
+from collections.abc import Iterator
+
+import pytest
+
+from logs.notifications import wait_for_outbox
+
+
+class FakeConnection:
+    """Stands in for a listening psycopg2 connection: readable once notifications are pending."""
+
+    def __init__(self) -> None:
+        self._reader, self._writer = socket.socketpair()
+        self._reader.setblocking(False)
+        self._pending: list[str] = []
+        self.notifies: list[str] = []
+
+    def fileno(self) -> int:
+        return self._reader.fileno()
+
+    def notify(self, count: int = 1) -> None:
+        self._pending.extend(["outbox_log"] * count)
+        self._writer.send(b"!")
+
+    def poll(self) -> None:
+        try:
+            self._reader.recv(1024)
+        except BlockingIOError:
+            return
+        self.notifies.extend(self._pending)
+        self._pending.clear()
+
+    def close(self) -> None:
+        self._reader.close()
+        self._writer.close()
+
+
+@pytest.fixture
+def f_conn() -> Iterator[FakeConnection]:
+    conn = FakeConnection()
+    yield conn
+    conn.close()
+
+
+def test_pending_notifications_are_collected_once(f_conn: FakeConnection) -> None:
+    f_conn.notify(3)
+    started = time.monotonic()
+
+    assert wait_for_outbox(f_conn, timeout=10, coalesce=0.05) == 3
+    assert time.monotonic() - started < 1
+    assert f_conn.notifies == []
+
+
+def test_notifications_within_the_coalescing_window_wake_once(f_conn: FakeConnection) -> None:
+    f_conn.notify(2)
+    late = threading.Timer(0.05, f_conn.notify)
+    late.start()
+
+    assert wait_for_outbox(f_conn, timeout=10, coalesce=0.5) == 3
+    late.join()
+
+
+def test_notification_after_the_coalescing_window_is_left_for_the_next_wait(f_conn: FakeConnection) -> None:
+    f_conn.notify()
+    late = threading.Timer(0.3, f_conn.notify)
+    late.start()
+
+    assert wait_for_outbox(f_conn, timeout=10, coalesce=0.05) == 1
+    late.join()
+    assert wait_for_outbox(f_conn, timeout=10, coalesce=0.05) == 1
+
+
+def test_wait_falls_back_to_the_timeout_without_notifications(f_conn: FakeConnection) -> None:
+    started = time.monotonic()
+
+    assert wait_for_outbox(f_conn, timeout=0.1, coalesce=0.05) == 0
+    assert time.monotonic() - started >= 0.1
@@ -0,0 +1,62 @@
+import asyncio
+import threading
+import time
+from typing import Never
+from unittest import mock
+
+import pytest
+from clickhouse_connect.driver.exceptions import OperationalError
+
+from core.event_log_client import EventLogClient
+from logs.models import OutboxLog
+from logs.pipeline import drain_pipelined
+from logs.services import claim_logs
+
+# the stages use their own database connections, so the rows must be committed
+pytestmark = [pytest.mark.django_db(transaction=True)]
+
+
+@pytest.fixture
+def f_outbox_logs() -> list[OutboxLog]:
+    return OutboxLog.objects.bulk_create(
+        OutboxLog(event_type="user_created", environment="Local", event_context={"n": i}) for i in range(25)
+    )
+
+
+@pytest.mark.usefixtures("f_outbox_logs")
+def test_pipelined_drain_delivers_every_batch() -> None:
+    with mock.patch.object(EventLogClient, "insert_columns", autospec=True) as insert_columns:
+        result = asyncio.run(drain_pipelined(batch_size=10, time_budget=60))
+
+    assert result.processed == 25
+    assert result.batches == 3
+    assert [len(call.args[1][0]) for call in insert_columns.call_args_list] == [10, 10, 5]
+    assert OutboxLog.objects.filter(processed=False).count() == 0
+
+
+@pytest.mark.usefixtures("f_outbox_logs")
+def test_failed_pipelined_drain_releases_leases() -> None:
+    claimed = threading.Event()
+
+    def slow_second_claim(*args: object, **kwargs: object) -> list[int]:
+        log_ids = claim_logs(*args, **kwargs)
+        if kwargs["after_id"]:
+            claimed.set()
+            # the second batch is still being fetched when the first insert fails
+            time.sleep(0.2)
+        return log_ids
+
+    def failing_insert(*_args: object, **_kwargs: object) -> Never:
+        claimed.wait(5)
+        raise OperationalError("clickhouse is down")
+
+    with (
+        mock.patch("logs.pipeline.claim_logs", side_effect=slow_second_claim),
+        mock.patch.object(EventLogClient, "insert_columns", side_effect=failing_insert),
+        pytest.raises(OperationalError),
+    ):
+        asyncio.run(drain_pipelined(batch_size=10, time_budget=60))
+
+    assert claimed.is_set()
+    assert OutboxLog.objects.filter(processed=False).count() == 25
+    assert not OutboxLog.objects.filter(locked_by__isnull=False).exists()
@@ -0,0 +1,170 @@
+import json
+from datetime import timedelta
+from unittest import mock
+
+import pytest
+from clickhouse_connect.driver import Client
+from clickhouse_connect.driver.exceptions import OperationalError
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.utils import timezone
+from pytest_django.fixtures import SettingsWrapper
+from structlog.testing import capture_logs
+
+from core.event_log_client import EventLogClient
+from core.serialization import decode_event_context, json_dumps
+from logs.models import OutboxLog
+from logs.retention import purge_processed_logs
+from logs.services import claim_logs, claimable_logs, drain_logs, process_logs
+
+pytestmark = [pytest.mark.django_db]
+
+
+@pytest.fixture
+def f_outbox_logs() -> list[OutboxLog]:
+    OutboxLog.objects.all().delete()
+    return OutboxLog.objects.bulk_create(
+        OutboxLog(
+            event_type="user_created",
+            environment="Local",
+            event_context={"email": f"user_{i}@test.com"},
+        )
+        for i in range(10)
+    )
+
+
+@pytest.fixture
+def f_event_log(f_ch_client: Client) -> Client:
+    f_ch_client.command(f"TRUNCATE TABLE {settings.CLICKHOUSE_EVENT_LOG_TABLE_NAME}")
+    return f_ch_client
+
+
+def _delivered_event_ids(f_ch_client: Client) -> list[str]:
+    # the table name comes from settings
+    sql = f"SELECT event_id FROM {settings.CLICKHOUSE_EVENT_LOG_TABLE_NAME}"  # noqa: S608
+    rows = f_ch_client.query(sql).result_rows
+    return sorted(str(row[0]) for row in rows)
+
+
+@pytest.mark.usefixtures("f_outbox_logs")
+def test_claims_are_disjoint() -> None:
+    first = claim_logs(batch_size=4, worker_id="worker-1")
+    second = claim_logs(batch_size=4, worker_id="worker-2")
+    third = claim_logs(batch_size=4, worker_id="worker-3")
+    assert len(first) == 4
+    assert len(second) == 4
+    assert len(third) == 2
+    assert not set(first) & set(second)
+    assert not (set(first) | set(second)) & set(third)
+    assert OutboxLog.objects.filter(locked_by="worker-1").count() == 4
+
+
+@pytest.mark.usefixtures("f_outbox_logs")
+def test_expired_lease_is_claimable_again() -> None:
+    claimed = claim_logs(batch_size=10, worker_id="crashed-worker")
+    assert claim_logs(batch_size=10, worker_id="worker-2") == []
+    OutboxLog.objects.filter(id__in=claimed).update(locked_until=timezone.now() - timedelta(seconds=1))
+    assert claim_logs(batch_size=10, worker_id="worker-2") == claimed
+
+
+def test_claims_page_by_id(f_outbox_logs: list[OutboxLog]) -> None:
+    first = claim_logs(batch_size=4, worker_id="worker-1")
+    OutboxLog.objects.filter(id__in=first).update(locked_by=None, locked_until=None)
+    assert claim_logs(batch_size=4, worker_id="worker-1", after_id=first[-1]) == [
+        log.id for log in f_outbox_logs[4:8]
+    ]
+
+
+@pytest.mark.usefixtures("f_outbox_logs")
+def test_batch_is_streamed_in_chunks(settings: SettingsWrapper) -> None:
+    settings.OUTBOX_STREAM_CHUNK_SIZE = 4
+    with mock.patch.object(EventLogClient, "insert_columns", autospec=True) as insert_columns:
+        assert process_logs(batch_size=10) == 10
+    assert [len(call.args[1][0]) for call in insert_columns.call_args_list] == [4, 4, 2]
+    assert OutboxLog.objects.filter(processed=False).count() == 0
+
+
+@pytest.mark.usefixtures("f_outbox_logs")
+def test_buffer_flush_logs_the_sent_bytes(settings: SettingsWrapper) -> None:
+    settings.CLICKHOUSE_BUFFER_MAX_ROWS = 100
+
+    def insert_columns(client: EventLogClient, _columns: list[list]) -> None:
+        client.wire_bytes += 123
+
+    with (
+        mock.patch.object(EventLogClient, "insert_columns", autospec=True, side_effect=insert_columns),
+        capture_logs() as logs,
+    ):
+        assert drain_logs(batch_size=20).processed == 10
+
+    flushed, = (log for log in logs if log["event"] == "Flushed buffered logs")
+    assert (flushed["processed_count"], flushed["wire_bytes"]) == (10, 123)
+    assert OutboxLog.objects.filter(processed=False).count() == 0
+
+
+@pytest.mark.usefixtures("f_outbox_logs")
+def test_failed_buffer_flush_releases_the_buffered_logs(settings: SettingsWrapper) -> None:
+    settings.CLICKHOUSE_BUFFER_MAX_ROWS = 100
+
+    with (
+        mock.patch.object(EventLogClient, "insert_columns", side_effect=OperationalError("clickhouse is down")),
+        pytest.raises(OperationalError),
+    ):
+        drain_logs(batch_size=4)
+
+    assert OutboxLog.objects.filter(processed=False).count() == 10
+    assert not OutboxLog.objects.filter(locked_by__isnull=False).exists()
+
+
+def test_claim_scan_uses_partial_unprocessed_index(f_outbox_logs: list[OutboxLog]) -> None:
+    OutboxLog.objects.filter(id__in=[log.id for log in f_outbox_logs[:5]]).update(processed=True)
+    with connection.cursor() as cursor:
+        # the test table is tiny, make the planner show the plan it picks at scale
+        cursor.execute("SET LOCAL enable_seqscan = off")
+    plan = claimable_logs(after_id=f_outbox_logs[0].id).values_list("id", flat=True)[:100].explain()
+    assert "outbox_unprocessed_idx" in plan
+
+
+def test_decode_event_context_unwraps_double_encoded_rows() -> None:
+    payload = {"email": "user@test.com"}
+    assert decode_event_context(json_dumps(payload)) == payload
+    assert decode_event_context(json.dumps(json.dumps(payload))) == payload
+
+
+def test_failed_insert_is_redelivered_without_losses(f_outbox_logs: list[OutboxLog], f_event_log: Client) -> None:
+    with mock.patch.object(EventLogClient, "_insert", side_effect=OperationalError("clickhouse is down")):
+        with pytest.raises(OperationalError):
+            process_logs(batch_size=10)
+    assert OutboxLog.objects.filter(processed=False).count() == 10
+
+    assert process_logs(batch_size=10) == 10
+    assert _delivered_event_ids(f_event_log) == sorted(str(log.event_id) for log in f_outbox_logs)
+
+
+def test_redelivery_after_failed_mark_processed_has_no_duplicates(
+    f_outbox_logs: list[OutboxLog], f_event_log: Client,
+) -> None:
+    with mock.patch("logs.services.mark_processed", side_effect=DatabaseError("connection lost")):
+        with pytest.raises(DatabaseError):
+            process_logs(batch_size=10)
+    assert OutboxLog.objects.filter(processed=False).count() == 10
+
+    assert process_logs(batch_size=10) == 10
+    assert OutboxLog.objects.filter(processed=False).count() == 0
+    assert _delivered_event_ids(f_event_log) == sorted(str(log.event_id) for log in f_outbox_logs)
+
+
+def test_purge_deletes_only_expired_processed_logs(f_outbox_logs: list[OutboxLog]) -> None:
+    expired, recent, pending = f_outbox_logs[:4], f_outbox_logs[4:6], f_outbox_logs[6:]
+    OutboxLog.objects.filter(id__in=[log.id for log in expired]).update(
+        processed=True, processed_at=timezone.now() - timedelta(days=8),
+    )
+    OutboxLog.objects.filter(id__in=[log.id for log in recent]).update(
+        processed=True, processed_at=timezone.now(),
+    )
+
+    result = purge_processed_logs(retention_hours=24 * 7, chunk_size=3)
+
+    assert result.deleted == 4
+    assert result.chunks == 2
+    assert set(OutboxLog.objects.values_list("id", flat=True)) == {log.id for log in recent + pending}
@@ -0,0 +1,160 @@
+import datetime as dt
+import uuid
+from collections.abc import Iterator
+from unittest import mock
+
+import pytest
+from clickhouse_connect.driver.binding import format_bind_value
+from django.test import Client
+
+from core.event_log_client import EventLogClient
+from logs import queries
+from logs.queries import EventCountQuery, EventLogQuery, QueryCache, query_events
+from users.models import User
+
+# clickhouse_connect returns DateTime64 values as naive UTC datetimes
+ROW = ("user_created", dt.datetime(2024, 1, 1, 12), "Local", '{"email":"user@test.com"}', 1, uuid.uuid4())  # noqa: DTZ001
+
+
+@pytest.fixture(autouse=True)
+def f_query_cache(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(queries, "_cache", QueryCache(max_size=2, ttl=30))
+
+
+@pytest.fixture
+def f_staff_client(client: Client, django_user_model: type[User]) -> Client:
+    client.force_login(django_user_model.objects.create(email="staff@test.com", is_staff=True))
+    return client
+
+
+@pytest.fixture
+def f_select() -> Iterator[mock.Mock]:
+    with mock.patch.object(EventLogClient, "init") as init:
+        client = init.return_value.__enter__.return_value
+        client.select.return_value = [ROW]
+        yield client.select
+
+
+def test_filters_are_bound_as_parameters() -> None:
+    sql, parameters = EventLogQuery(
+        event_types=["user_created", "user_created'; DROP TABLE event_log"],
+        start=dt.datetime(2024, 1, 1, tzinfo=dt.UTC),
+        limit=10,
+    ).to_sql()
+
+    assert "DROP TABLE" not in sql
+    assert "WHERE event_date_time >= {start:DateTime64(6)} AND event_type IN {event_types:Array(String)}" in sql
+    assert sql.endswith("ORDER BY event_date_time, event_type LIMIT {limit:UInt32}")
+    assert parameters["limit"] == 10
+
+
+def test_range_bounds_keep_microseconds() -> None:
+    start = dt.datetime(2024, 1, 1, 12, 0, 0, 250000, tzinfo=dt.timezone(dt.timedelta(hours=2)))
+    _, parameters = EventLogQuery(start=start, end=start + dt.timedelta(microseconds=1)).to_sql()
+
+    assert format_bind_value(parameters["start"], server_tz=dt.UTC) == "2024-01-01 10:00:00.250000"
+    assert format_bind_value(parameters["end"], server_tz=dt.UTC) == "2024-01-01 10:00:00.250001"
+    assert QueryCache.key("SELECT 1", parameters) != QueryCache.key(
+        "SELECT 1", EventLogQuery(start=start, end=start + dt.timedelta(microseconds=2)).to_sql()[1],
+    )
+
+
+def test_query_cache_evicts_least_recently_used_and_expired_entries(monkeypatch: pytest.MonkeyPatch) -> None:
+    cache = QueryCache(max_size=2, ttl=30)
+    now = {"value": 100.0}
+    monkeypatch.setattr(queries.time, "monotonic", lambda: now["value"])
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    now["value"] += 30
+    assert cache.get("a") is None
+
+
+def test_repeated_query_is_served_from_cache(f_select: mock.Mock) -> None:
+    query = EventLogQuery(event_types=["user_created"], limit=5)
+
+    first = query_events(query)
+    second = query_events(EventLogQuery(event_types=["user_created", "user_created"], limit=5))
+
+    assert first == second
+    assert first[0]["event_context"] == {"email": "user@test.com"}
+    f_select.assert_called_once()
+
+
+def test_changing_a_result_does_not_change_the_cached_one(f_select: mock.Mock) -> None:
+    query = EventLogQuery(event_types=["user_created"], limit=5)
+
+    query_events(query)[0]["event_context"]["email"] = "changed@test.com"
+    hit = query_events(query)
+    hit[0]["event_context"]["email"] = "changed@test.com"
+    hit.clear()
+
+    assert query_events(query)[0]["event_context"] == {"email": "user@test.com"}
+    f_select.assert_called_once()
+
+
+@pytest.mark.parametrize("path", ["/events", "/events/counts"])
+def test_event_endpoints_require_staff(client: Client, f_select: mock.Mock, path: str) -> None:
+    response = client.get(path)
+
+    assert response.status_code == 302
+    assert response["Location"].startswith("/admin/login/")
+    f_select.assert_not_called()
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("f_select")
+def test_events_endpoint(f_staff_client: Client) -> None:
+    client = f_staff_client
+    response = client.get("/events", {"event_type": "user_created", "start": "2024-01-01T00:00:00"})
+    assert response.status_code == 200
+    assert response.json()["events"][0]["event_id"] == str(ROW[5])
+
+    assert client.get("/events", {"start": "yesterday"}).status_code == 400
+    assert client.get("/events", {"limit": 10**9}).status_code == 400
+
+
+@pytest.mark.parametrize(
+    ("interval", "start", "table"),
+    [
+        ("day", dt.datetime(2024, 1, 1, tzinfo=dt.UTC), "event_counts_1d"),
+        ("day", dt.datetime(2024, 1, 1, 6, tzinfo=dt.UTC), "event_counts_1h"),
+        ("hour", dt.datetime(2024, 1, 1, 6, 30, tzinfo=dt.UTC), "event_counts_1m"),
+        ("minute", dt.datetime(2024, 1, 1, 6, 30, 15, tzinfo=dt.UTC), None),
+        # midnight at +02:00 is 22:00 UTC, inside a UTC day bucket
+        ("day", dt.datetime(2024, 1, 1, tzinfo=dt.timezone(dt.timedelta(hours=2))), "event_counts_1h"),
+        ("day", dt.datetime(2024, 1, 1, 2, tzinfo=dt.timezone(dt.timedelta(hours=2))), "event_counts_1d"),
+    ],
+)
+def test_count_query_is_routed_to_the_coarsest_fitting_rollup(
+    interval: str, start: dt.datetime, table: str | None,
+) -> None:
+    query = EventCountQuery(interval=interval, start=start, end=dt.datetime(2024, 2, 1, tzinfo=dt.UTC))
+    sql, _ = query.to_sql()
+
+    assert query.rollup().table == table
+    assert f"FROM default.{table or 'event_log'} " in sql
+
+
+@pytest.mark.django_db
+def test_counts_endpoint(f_staff_client: Client, f_select: mock.Mock) -> None:
+    client = f_staff_client
+    f_select.return_value = [(ROW[1], "user_created", 3)]
+
+    response = client.get("/events/counts", {"interval": "hour", "event_type": "user_created"})
+
+    assert response.status_code == 200
+    assert response.json()["counts"] == [{"bucket": "2024-01-01T12:00:00", "event_type": "user_created", "events": 3}]
+    assert "FROM default.event_counts_1h" in f_select.call_args.args[0]
+    assert client.get("/events/counts", {"interval": "week"}).status_code == 400
+
+
+def test_context_filters_use_projected_columns() -> None:
+    sql, parameters = EventLogQuery(context={"email": "user@test.com", "plan": "pro"}).to_sql()
+
+    assert "context_email = {context_0:String}" in sql
+    assert "JSONExtractString(event_context, {context_1_field:String}) = {context_1:String}" in sql
+    assert parameters == {"context_0": "user@test.com", "context_1_field": "plan", "context_1": "pro"}
+    assert EventCountQuery(context={"email": "user@test.com"}).rollup().table is None
@@ -0,0 +1,55 @@
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+from pytest_django.fixtures import SettingsWrapper
+
+from logs.models import OutboxLog
+from logs.services import claim_logs
+from logs.sharding import get_shard, get_shards
+
+SHARDS = {
+    "signups": {"event_types": ["user_created"], "queue": "outbox.signups", "priority": 9, "workers": 2},
+    "hashed_a": {},
+    "hashed_b": {},
+}
+
+
+@pytest.fixture
+def f_shards(settings: SettingsWrapper) -> None:
+    settings.OUTBOX_SHARDS = SHARDS
+    settings.OUTBOX_DRAIN_WORKERS = 1
+
+
+@pytest.mark.usefixtures("f_shards")
+def test_hash_shards_split_the_unlisted_event_types() -> None:
+    signups, hashed_a, hashed_b = get_shards()
+    assert (signups.queue, signups.priority, signups.workers) == ("outbox.signups", 9, 2)
+    assert (hashed_a.hash_index, hashed_b.hash_index) == (0, 1)
+    assert hashed_a.hash_count == hashed_b.hash_count == 2
+    assert hashed_a.reserved_types == ("user_created",)
+    assert get_shards(workers=4)[0].workers == 4
+
+
+def test_misconfigured_shards_are_rejected(settings: SettingsWrapper) -> None:
+    settings.OUTBOX_SHARDS = {"a": {"event_types": ["user_created"]}, "b": {"event_types": ["user_created"]}}
+    with pytest.raises(ImproperlyConfigured):
+        get_shards()
+    settings.OUTBOX_SHARDS = {"a": {"event_types": ["user_created"]}}
+    with pytest.raises(ImproperlyConfigured):
+        get_shards()
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("f_shards")
+def test_shards_claim_disjoint_slices_of_the_outbox() -> None:
+    OutboxLog.objects.all().delete()
+    logs = OutboxLog.objects.bulk_create(
+        OutboxLog(event_type=event_type, environment="Local", event_context={})
+        for event_type in ["user_created", "user_deleted", "user_updated"] * 4
+    )
+
+    claimed = {name: claim_logs(batch_size=100, worker_id=name, shard=get_shard(name)) for name in SHARDS}
+
+    assert claimed["signups"] == [log.id for log in logs if log.event_type == "user_created"]
+    assert all(log_id % 2 == 0 for log_id in claimed["hashed_a"])
+    assert all(log_id % 2 == 1 for log_id in claimed["hashed_b"])
+    assert sorted(sum(claimed.values(), [])) == [log.id for log in logs]
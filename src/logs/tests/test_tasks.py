@@ -0,0 +1,110 @@
+from collections.abc import Iterator
+from contextlib import AbstractContextManager
+from unittest import mock
+
+import pytest
+from django.core.cache import cache
+from pytest_django.fixtures import SettingsWrapper
+
+from logs import services, tasks
+from logs.services import BatchStats, DrainResult, drain_logs
+from logs.tasks import DRAIN_SLOT_KEY, dispatch_outbox_task, process_outbox_task
+
+SLOT_KEY = DRAIN_SLOT_KEY.format(shard="default", slot=0)
+
+
+@pytest.fixture(autouse=True)
+def f_cache(settings: SettingsWrapper) -> None:
+    settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    settings.OUTBOX_SHARDS = {"default": {}}
+    settings.OUTBOX_IDLE_BACKOFF_MIN = 1.0
+    settings.OUTBOX_IDLE_BACKOFF_MAX = 4.0
+    cache.clear()
+
+
+@pytest.fixture
+def f_apply_async() -> Iterator[mock.Mock]:
+    with mock.patch.object(process_outbox_task, "apply_async") as apply_async:
+        yield apply_async
+
+
+def _drain_returns(result: DrainResult | Exception) -> AbstractContextManager[mock.Mock]:
+    return mock.patch.object(tasks, "drain_logs", side_effect=[result])
+
+
+def test_held_slot_blocks_a_second_chain(f_apply_async: mock.Mock) -> None:
+    dispatch_outbox_task(batch_size=10, workers=2)
+    dispatch_outbox_task(batch_size=10, workers=2)
+
+    assert [call.kwargs["kwargs"]["slot"] for call in f_apply_async.call_args_list] == [0, 1]
+    assert cache.get(SLOT_KEY) == "starting"
+
+
+def test_chain_continues_right_away_on_a_backlog(f_apply_async: mock.Mock) -> None:
+    with _drain_returns(DrainResult(processed=10, batches=1, backlog=True, batch_size=10)):
+        assert process_outbox_task(batch_size=10, slot=0, idle_delay=2.0, shard="default") == 10
+
+    f_apply_async.assert_called_once()
+    assert f_apply_async.call_args.kwargs["countdown"] == 0
+    assert f_apply_async.call_args.kwargs["kwargs"]["idle_delay"] == 0
+    assert SLOT_KEY in cache
+
+
+@pytest.mark.parametrize(("idle_delay", "countdown"), [(0.0, 1.0), (1.0, 2.0), (2.0, 4.0)])
+def test_idle_chain_backs_off(f_apply_async: mock.Mock, idle_delay: float, countdown: float) -> None:
+    with _drain_returns(DrainResult()):
+        process_outbox_task(slot=0, idle_delay=idle_delay, shard="default")
+
+    assert f_apply_async.call_args.kwargs["countdown"] == countdown
+
+
+def test_idle_backoff_past_the_max_ends_the_chain(f_apply_async: mock.Mock) -> None:
+    cache.set(SLOT_KEY, "previous-task")
+
+    with _drain_returns(DrainResult()):
+        process_outbox_task(slot=0, idle_delay=4.0, shard="default")
+
+    f_apply_async.assert_not_called()
+    assert SLOT_KEY not in cache
+
+
+def test_failed_drain_releases_the_slot(f_apply_async: mock.Mock) -> None:
+    cache.set(SLOT_KEY, "previous-task")
+
+    with _drain_returns(RuntimeError("clickhouse is down")), pytest.raises(RuntimeError):
+        process_outbox_task(slot=0, shard="default")
+
+    f_apply_async.assert_not_called()
+    assert SLOT_KEY not in cache
+
+
+@pytest.fixture
+def f_batches(settings: SettingsWrapper, monkeypatch: pytest.MonkeyPatch) -> list[int]:
+    """Batch sizes `_process_batch` fills, each taking 10 seconds; an empty list means full batches."""
+    settings.CLICKHOUSE_BUFFER_MAX_ROWS = 0
+    clock = {"now": 0.0}
+    sizes: list[int] = []
+
+    def process_batch(batch_size: int, *_args: object, **_kwargs: object) -> BatchStats:
+        clock["now"] += 10
+        size = sizes.pop(0) if sizes else batch_size
+        return BatchStats(log_ids=list(range(1, size + 1)))
+
+    monkeypatch.setattr(services.time, "monotonic", lambda: clock["now"])
+    monkeypatch.setattr(services, "_process_batch", process_batch)
+    return sizes
+
+
+@pytest.mark.usefixtures("f_batches")
+def test_drain_stops_on_the_time_budget_with_a_backlog() -> None:
+    result = drain_logs(batch_size=5, time_budget=25)
+
+    assert (result.processed, result.batches, result.backlog) == (15, 3, True)
+
+
+def test_drain_stops_on_a_partial_batch(f_batches: list[int]) -> None:
+    f_batches.extend([5, 2])
+
+    result = drain_logs(batch_size=5, time_budget=100)
+
+    assert (result.processed, result.batches, result.backlog) == (7, 2, False)
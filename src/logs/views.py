@@ -0,0 +1,83 @@
+from clickhouse_connect.driver.exceptions import DatabaseError
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpRequest, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from pydantic import ValidationError
+
+import logs.metrics  # noqa: F401 registers the outbox collector
+from core.metrics import render_metrics
+from core.serialization import json_dumps, json_loads
+from logs.queries import EventCountQuery, EventLogQuery, count_events, query_events, stream_events
+
+
+def metrics(request: HttpRequest) -> HttpResponse:  # noqa: ARG001
+    body, content_type = render_metrics()
+    return HttpResponse(body, content_type=content_type)
+
+
+@require_GET
+@staff_member_required
+def events(request: HttpRequest) -> HttpResponse:
+    """
+    event_log rows filtered by `event_type` (repeatable), `environment`, an
+    ISO `start`/`end` range and `context.<field>` values, in
+    (event_date_time, event_type) order.
+    With `stream=1` every matching row is streamed as NDJSON instead.
+    Staff only: event contexts hold personal data.
+    """
+    stream = request.GET.get('stream') == '1'
+    try:
+        query = EventLogQuery(
+            **_filters(request),
+            limit=request.GET.get('limit', None if stream else settings.EVENT_LOG_QUERY_DEFAULT_LIMIT),
+        )
+    except ValidationError as e:
+        return _invalid(e)
+    if query.limit is not None and query.limit > settings.EVENT_LOG_QUERY_MAX_LIMIT:
+        return JsonResponse({'errors': [{'loc': ['limit'], 'msg': 'limit is too large'}]}, status=400)
+    return _events_response(query, stream)
+
+
+def _events_response(query: EventLogQuery, stream: bool) -> HttpResponse:
+    if stream:
+        return StreamingHttpResponse(
+            (f'{json_dumps(event)}\n' for event in stream_events(query)), content_type='application/x-ndjson',
+        )
+    try:
+        return JsonResponse({'events': query_events(query)})
+    except DatabaseError:
+        return JsonResponse({'errors': [{'msg': 'event log is unavailable'}]}, status=503)
+
+
+@require_GET
+@staff_member_required
+def event_counts(request: HttpRequest) -> HttpResponse:
+    """
+    Events per `interval` (minute, hour or day) and event type, with the
+    filters of `events`. Answered from the coarsest rollup table that fits.
+    """
+    try:
+        query = EventCountQuery(**_filters(request), interval=request.GET.get('interval', 'hour'))
+    except ValidationError as e:
+        return _invalid(e)
+    try:
+        return JsonResponse({'counts': count_events(query)})
+    except DatabaseError:
+        return JsonResponse({'errors': [{'msg': 'event log is unavailable'}]}, status=503)
+
+
+def _filters(request: HttpRequest) -> dict:
+    return {
+        'event_types': request.GET.getlist('event_type'),
+        'environment': request.GET.get('environment'),
+        'start': request.GET.get('start'),
+        'end': request.GET.get('end'),
+        'context': {
+            key.removeprefix('context.'): value for key, value in request.GET.items() if key.startswith('context.')
+        },
+    }
+
+
+def _invalid(error: ValidationError) -> JsonResponse:
+    return JsonResponse({'errors': json_loads(error.json(include_url=False))}, status=400)
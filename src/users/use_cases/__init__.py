@@ -1,3 +1,12 @@
+from .bulk_create_users import BulkCreateUsers, BulkCreateUsersRequest, BulkCreateUsersResponse
 from .create_user import CreateUser, CreateUserRequest, CreateUserResponse, UserCreated
 
-__all__ = ['CreateUser', 'CreateUserRequest', 'CreateUserResponse', 'UserCreated']
+__all__ = [
+    'BulkCreateUsers',
+    'BulkCreateUsersRequest',
+    'BulkCreateUsersResponse',
+    'CreateUser',
+    'CreateUserRequest',
+    'CreateUserResponse',
+    'UserCreated',
+]
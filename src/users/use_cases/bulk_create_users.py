@@ -0,0 +1,71 @@
+from typing import Any
+
+import structlog
+from django.db import transaction as db_transaction
+
+from core.use_case import UseCase, UseCaseRequest, UseCaseResponse
+from users.models import User
+from users.use_cases.create_user import CreateUserRequest, UserCreated
+
+logger = structlog.get_logger(__name__)
+
+BULK_CREATE_BATCH_SIZE = 1000
+
+
+class BulkCreateUsersRequest(UseCaseRequest):
+    users: list[CreateUserRequest]
+
+
+class BulkCreateUsersResponse(UseCaseResponse):
+    result: list[User] = []
+    skipped: list[str] = []
+    error: str = ''
+
+
+class BulkCreateUsers(UseCase):
+    """
+    Create users set-based: one existence lookup and one INSERT per chunk,
+    and all user_created events in a single outbox INSERT at commit.
+    Emails that already exist (or repeat in the request) are skipped.
+    """
+
+    def _get_context_vars(self, request: BulkCreateUsersRequest) -> dict[str, Any]:
+        return {
+            'use_case': self.__class__.__name__,
+            'users_count': len(request.users),
+        }
+
+    @db_transaction.atomic
+    def _execute(self, request: BulkCreateUsersRequest) -> BulkCreateUsersResponse:
+        logger.info('creating users in bulk')
+        created, skipped = [], []
+        seen = set()
+
+        for start in range(0, len(request.users), BULK_CREATE_BATCH_SIZE):
+            chunk = request.users[start:start + BULK_CREATE_BATCH_SIZE]
+            created.extend(User.objects.bulk_create(self._new_users(chunk, seen, skipped)))
+
+        for user in created:
+            self._emit(
+                UserCreated(email=user.email, first_name=user.first_name, last_name=user.last_name),
+            )
+
+        logger.info('users have been created', created_count=len(created), skipped_count=len(skipped))
+        return BulkCreateUsersResponse(result=created, skipped=skipped)
+
+    @staticmethod
+    def _new_users(chunk: list[CreateUserRequest], seen: set[str], skipped: list[str]) -> list[User]:
+        """Users of `chunk` not in the database or earlier in the request; the others go to `skipped`."""
+        existing = set(
+            User.objects.filter(email__in=[user.email for user in chunk]).values_list('email', flat=True),
+        )
+        new_users = []
+        for user in chunk:
+            if user.email in existing or user.email in seen:
+                skipped.append(user.email)
+                continue
+            seen.add(user.email)
+            new_users.append(
+                User(email=user.email, first_name=user.first_name, last_name=user.last_name),
+            )
+        return new_users
@@ -1,14 +1,17 @@
 from typing import Any
+
 import structlog
+from django.db import transaction as db_transaction
+
 from core.base_model import Model
+from core.events import register_event
 from core.use_case import UseCase, UseCaseRequest, UseCaseResponse
 from users.models import User
-from users.models import Outbox
-from django.utils import timezone
-from django.db import transaction as db_transaction
+
 logger = structlog.get_logger(__name__)
 
 
+@register_event('user_created', projected=('email',), indexed=('email',))
 class UserCreated(Model):
     email: str
     first_name: str
@@ -53,16 +56,6 @@ class CreateUser(UseCase):
         return CreateUserResponse(error='User with this email already exists')
 
     def _log_to_outbox(self, user: User) -> None:
-        Outbox.objects.create(
-            event_type="user_created",
-            event_date_time=timezone.now(),
-            environment="Local",
-            event_context={
-                "email": user.email,
-                "first_name": user.first_name,
-                "last_name": user.last_name
-            },
-            metadata_version=1,
-            processed=False
+        self._emit(
+            UserCreated(email=user.email, first_name=user.first_name, last_name=user.last_name),
         )
-